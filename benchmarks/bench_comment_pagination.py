@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark serial vs. parallel pagination of get_comments_of_page.
+
+A local HTTP server stands in for Confluence. It serves the comments of a
+page in chunks of PAGE_SIZE with an artificial latency per request, like a
+Confluence instance that caps the `limit` parameter. Usage:
+
+    python benchmarks/bench_comment_pagination.py [latency in ms]
+
+Afterwards, it checks that opening a thread whose prefetch is still running
+sends no second request.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import headless
+
+PAGE_SIZE = 25
+PAGE_COUNTS = [1, 2, 5, 10, 20, 40]
+LATENCY = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.1
+TOTAL = {"comments": 0}
+# Requests the server has answered
+HITS = {"count": 0}
+
+
+def make_comment(i: int) -> dict:
+    user = {"displayName": f"User {i % 7}", "username": f"user{i % 7}"}
+    when = "2020-05-04T12:00:00.000+02:00"
+    ancestors = [{"id": str(i - 1)}] if i % 3 else []
+    return {
+        "id": str(i),
+        "type": "comment",
+        "title": f"Re: Page {i}",
+        "body": {"view": {"value": f"<p>Comment number {i}</p>"}},
+        "history": {"lastUpdated": {"by": user, "when": when}, "createdDate": when},
+        "version": {"number": 1, "by": user, "when": when},
+        "ancestors": ancestors,
+        "_links": {"webui": f"/display/X/Page?focusedCommentId={i}"},
+    }
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        pass
+
+    def do_GET(self) -> None:
+        HITS["count"] += 1
+        time.sleep(LATENCY)
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        start = int(query.get("start", ["0"])[0])
+        limit = min(int(query.get("limit", [str(PAGE_SIZE)])[0]), PAGE_SIZE)
+        total = TOTAL["comments"]
+        results = [make_comment(i) for i in range(start, min(start + limit, total))]
+        body: dict = {"results": results, "start": start, "limit": limit, "size": len(results), "totalSize": total}
+        body["_links"] = {}
+        if start + limit < total:
+            body["_links"]["next"] = f"{url.path}?start={start + limit}&limit={limit}&depth=all"
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def setup(port: int) -> None:
+    tmp = tempfile.mkdtemp(prefix="congruence-bench-")
+    for var in ("XDG_CONFIG_HOME", "XDG_CACHE_HOME", "XDG_DATA_HOME"):
+        os.environ[var] = tmp
+    config = os.path.join(tmp, "config.yaml")
+    with open(config, "w") as f:
+        f.write(f"Host: 127.0.0.1:{port}\nProtocol: http\nPlugins: []\n")
+    headless.setup(config, CacheSize=0, PrefetchSize=1)
+
+
+def serial(page_id: str) -> int:
+    """The old behaviour: follow _links.next one page at a time."""
+    from congruence.confluence import comments_request
+    from congruence.interface import make_request
+
+    request = comments_request(page_id)
+    url, params = request["url"], request["params"]
+    items = []
+    while True:
+        parsed = make_request(url, params=params).json()
+        items += parsed["results"]
+        if "next" not in parsed["_links"]:
+            return len(items)
+        url, params = parsed["_links"]["next"], {}
+
+
+def open_while_prefetching(page_id: str) -> int:
+    """Open the comments of *page_id* while their prefetch is running and
+    return the number of requests the server received."""
+    from congruence.confluence import comments_request, get_comments_of_page
+    from congruence.interface import prefetch
+
+    before = HITS["count"]
+    prefetch([comments_request(page_id)])
+    # Let the prefetch reach the server
+    time.sleep(LATENCY / 2)
+    get_comments_of_page(page_id)
+    return HITS["count"] - before
+
+
+def main() -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    setup(server.server_address[1])
+    from congruence.confluence import get_comments_of_page
+
+    print(f"Latency per request: {LATENCY * 1000:.0f} ms, page size: {PAGE_SIZE}")
+    print(f"{'pages':>6} {'comments':>9} {'serial [s]':>11} {'parallel [s]':>13} {'speedup':>8}")
+    for pages in PAGE_COUNTS:
+        TOTAL["comments"] = pages * PAGE_SIZE
+        t0 = time.perf_counter()
+        n_serial = serial("1")
+        t1 = time.perf_counter()
+        tree = get_comments_of_page("1")
+        t2 = time.perf_counter()
+        assert n_serial == TOTAL["comments"], n_serial
+        assert tree, "empty comment tree"
+        print(f"{pages:>6} {n_serial:>9} {t1 - t0:>11.2f} {t2 - t1:>13.2f} {(t1 - t0) / (t2 - t1):>7.1f}x")
+
+    from congruence.interface import prefetcher
+
+    assert prefetcher is not None
+    TOTAL["comments"] = PAGE_SIZE
+    requests = open_while_prefetching("2")
+    stats = prefetcher.stats()
+    print(f"Opened a thread while it was prefetched: {requests} request(s), prefetcher {stats}")
+    assert requests == 1, "the prefetched thread was requested again"
+    assert stats["stored"] == 0, "the prefetcher kept a response that was already used"
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
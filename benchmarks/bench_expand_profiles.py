@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compare payload sizes of the former hard-coded expand parameters with
+the expand profiles.
+
+The sizes depend on the content of your Confluence, so this runs against
+the instance configured in your config file. Usage:
+
+    python benchmarks/bench_expand_profiles.py [-c config.yaml] [CQL]
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from headless import setup
+
+# What the views requested before there were expand profiles
+OLD_SEARCH = "content.space,content.history.lastUpdated,content.history.previousVersion,space.homepage.history"
+OLD_SPACE_CONTENT = "body,version,history.lastUpdated,space"
+OLD_COMMENTS = "body.view,content,history.lastUpdated,version,ancestors,extensions.inlineProperties,version"
+
+
+def size(url: str, params: dict) -> int:
+    from congruence.interface import make_request
+
+    r = make_request(url, params=params)
+    r.raise_for_status()
+    return len(r.content)
+
+
+def compare(name: str, url: str, params: dict, old: str, new: str) -> None:
+    old_size = size(url, {**params, "expand": old})
+    new_size = size(url, {**params, "expand": new})
+    saving = 1 - new_size / old_size if old_size else 0
+    print(f"{name:<28} {old_size / 1024:>10.1f} {new_size / 1024:>10.1f} {saving:>8.0%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-c", "--config", default="", help="congruence configuration file")
+    parser.add_argument("cql", nargs="?", default="type = page order by lastmodified desc")
+    args = parser.parse_args()
+    # Measure what the server sends, not what the cache has
+    setup(args.config, CacheSize=0, PrefetchSize=0)
+
+    from congruence.interface import make_request
+    from congruence.profiles import expand
+
+    search = {"cql": args.cql, "limit": 50}
+    print(f"{'Request':<28} {'old [KiB]':>10} {'new [KiB]':>10} {'saving':>8}")
+    compare("search (list)", "rest/api/search", search, OLD_SEARCH, expand("list", prefix="content."))
+
+    hits = make_request("rest/api/search", params={**search, "expand": "content.space"}).json()["results"]
+    pages = [h["content"] for h in hits if h.get("content", {}).get("type") == "page"]
+    if not pages:
+        print("No pages found, try another CQL query")
+        return
+    key = pages[0]["space"]["key"]
+    compare(
+        f"space {key} content (list)",
+        f"rest/api/space/{key}/content",
+        {"depth": "root"},
+        OLD_SPACE_CONTENT,
+        expand("list"),
+    )
+    compare(
+        f"children of {pages[0]['id']} (list)",
+        f"rest/api/content/{pages[0]['id']}/child/page",
+        {},
+        OLD_SPACE_CONTENT,
+        expand("list"),
+    )
+    compare(
+        f"comments of {pages[0]['id']}",
+        f"rest/api/content/{pages[0]['id']}/child/comment",
+        {"depth": "all", "limit": 9999},
+        OLD_COMMENTS,
+        expand("comments"),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Compare the former BeautifulSoup-based HTML conversion with htmltext.
+
+Bodies are taken from recordings made with `congruence --record FILE` or
+from HTML files, so the benchmark runs on real content without contacting
+the server. Without arguments, it uses a small built-in sample,
+with and without emoticons. Usage:
+
+    python benchmarks/bench_htmltext.py [RECORDING.jsonl[.gz] | FILE.html ...]
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import re
+import sys
+import time
+from collections.abc import Iterator
+
+import html2text
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from congruence import htmltext
+
+REPEAT = 5
+
+SAMPLE = """<p>Thanks <a class="confluence-userlink user-mention" href="/display/~jdoe">John Doe</a>,
+looks good <img class="emoticon emoticon-smile" src="/images/icons/emoticons/smile.svg" alt="(smile)"/>
+but see <a class="createlink"
+href="/pages/createpage.action?spaceKey=X&amp;title=Todo&amp;linkCreation=true&amp;fromPageId=123456">Todo</a>.</p>
+<ul><li>first <img class="emoticon emoticon-tick" src="tick.svg"/></li><li>second <strong>bold</strong></li></ul>
+<div class="code panel pdl"><div class="codeContent panelContent pdl"><pre>print("hello")</pre></div></div>
+<table class="confluenceTable"><tr><th>a</th><th>b</th></tr><tr><td>1</td><td>2</td></tr></table>
+<p>No markers in this paragraph at all, just <em>text</em>.</p>
+"""
+
+# Most bodies have neither emoticons nor creation links
+PLAIN = re.sub(r"<img[^>]*>|class=\"createlink\"", "", SAMPLE)
+
+
+def old_html_to_text(html: str, replace_emoticons: bool = False, fix_creation_links: bool = False) -> str:
+    """html_to_text as it was before htmltext: up to three parses."""
+    if replace_emoticons:
+        soup = BeautifulSoup(html, features="lxml")
+        for emoticon in soup.find_all("img", "emoticon"):  # type: ignore[arg-type]
+            for k, v in {k[len("emoticon-") :]: v for k, v in htmltext.EMOTICONS.items()}.items():
+                if f"emoticon-{k}" in emoticon["class"]:
+                    emoticon.replace_with(v)
+        html = str(soup)
+    if fix_creation_links:
+        soup = BeautifulSoup(html, features="lxml")
+        for link in soup.find_all("a", "createlink"):  # type: ignore[arg-type]
+            link["href"] = re.sub("[0-9]+$", "", link["href"])
+        html = str(soup)
+    return html2text.html2text(html).strip()
+
+
+def _bodies(value: object) -> Iterator[str]:
+    """Find the HTML of all bodies in a decoded API response."""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key in ("view", "storage", "export_view") and isinstance(item, dict) and "value" in item:
+                yield item["value"]
+            elif key in ("renderedContent", "description") and isinstance(item, str):
+                yield item
+            else:
+                yield from _bodies(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _bodies(item)
+
+
+def load(filename: str) -> list[str]:
+    if filename.endswith((".html", ".htm")):
+        with open(filename) as f:
+            return [f.read()]
+    bodies = []
+    with gzip.open(filename, "rt") if filename.endswith(".gz") else open(filename) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            headers = {k.lower(): v for k, v in entry["headers"].items()}
+            if entry["encoding"] != "utf-8" or "json" not in headers.get("content-type", ""):
+                continue
+            try:
+                bodies += [b for b in _bodies(json.loads(entry["body"])) if b]
+            except ValueError:
+                pass
+    return bodies
+
+
+def timed(f: object, bodies: list[str]) -> tuple[float, list[str]]:
+    results: list[str] = []
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        results = [f(b, True, True) for b in bodies]  # type: ignore[operator]
+    return (time.perf_counter() - start) / REPEAT, results
+
+
+def main() -> None:
+    bodies = [b for name in sys.argv[1:] for b in load(name)] or [SAMPLE, PLAIN] * 100
+    size = sum(len(b) for b in bodies)
+    print(f"{len(bodies)} bodies, {size / 1024:.0f} KiB")
+    marked = sum(1 for b in bodies if "emoticon" in b or "createlink" in b)
+    print(f"{marked} contain emoticons or creation links")
+
+    old_time, old = timed(old_html_to_text, bodies)
+    new_time, new = timed(htmltext.html_to_text, bodies)
+    print(f"{'before [ms]':>12} {'after [ms]':>11} {'speedup':>8}")
+    print(f"{old_time * 1000:>12.1f} {new_time * 1000:>11.1f} {old_time / new_time:>7.1f}x")
+    differences = sum(1 for a, b in zip(old, new, strict=True) if a != b)
+    print(f"{differences} of {len(bodies)} results differ")
+
+
+if __name__ == "__main__":
+    main()
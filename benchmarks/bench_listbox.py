@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure how a list view copes with a growing number of entries.
+
+Entries are appended in batches, as search results arrive, and the list is
+drawn after each batch; then it is scrolled by pages. Nothing is sent to the
+server, but a configuration file is needed. Usage:
+
+    python benchmarks/bench_listbox.py [ENTRIES ...] [-c CONFIG]
+"""
+
+from __future__ import annotations
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# The remaining arguments are for congruence.args, which parses the command
+# line when it is imported
+sizes = []
+while len(sys.argv) > 1 and sys.argv[1].isdigit():
+    sizes.append(int(sys.argv.pop(1)))
+
+import congruence.app  # noqa: E402
+
+# Views only use the running application for prefetching, which needs a main loop
+congruence.app.app = None  # type: ignore[attr-defined]
+
+from congruence.views.common import CongruenceView  # noqa: E402
+from congruence.views.listbox import ColumnListBoxEntry, CongruenceListBox  # noqa: E402
+
+CongruenceView.app = None  # type: ignore[assignment]
+
+BATCH = 500
+PAGES = 30
+SIZE = (120, 40)
+
+
+class Row:
+    def __init__(self, i: int) -> None:
+        self.i = i
+
+    def get_columns(self) -> list[str]:
+        return ["P", f"SPACE{self.i % 7}", f"User Number {self.i % 13}", "05/04/20", f"Page title number {self.i}"]
+
+
+def fill(entries: int) -> tuple[CongruenceListBox, list[float]]:
+    """Append *entries* in batches and draw the list after each one."""
+    listbox = CongruenceListBox([])
+    times = []
+    for start in range(0, entries, BATCH):
+        batch = [ColumnListBoxEntry(Row(i)) for i in range(start, min(start + BATCH, entries))]
+        begin = time.perf_counter()
+        listbox.entries += batch
+        listbox.redraw()
+        listbox.render(SIZE, focus=True)
+        times.append(time.perf_counter() - begin)
+    return listbox, times
+
+
+def run(entries: int) -> None:
+    # Memory is measured separately, since tracemalloc slows everything down
+    gc.collect()
+    tracemalloc.start()
+    listbox, _ = fill(entries)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del listbox
+    listbox, times = fill(entries)
+    begin = time.perf_counter()
+    for _ in range(PAGES):
+        listbox.page_down(SIZE)
+        listbox.render(SIZE, focus=True)
+    scroll = (time.perf_counter() - begin) / PAGES
+    print(
+        f"{entries:>8} {size / 2**20:>11.1f} {times[0] * 1000:>13.1f} {times[-1] * 1000:>12.1f} {scroll * 1000:>15.1f}"
+    )
+
+
+def main() -> None:
+    print(f"{'entries':>8} {'memory [MiB]':>11} {'first add [ms]':>13} {'last add [ms]':>12} {'page down [ms]':>15}")
+    for entries in sizes or [1000, 5000, 20000]:
+        run(entries)
+
+
+if __name__ == "__main__":
+    main()
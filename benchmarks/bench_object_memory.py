@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure the memory taken by the objects of a long comment thread.
+
+A synthetic thread with a handful of authors is decoded from JSON, one
+comment at a time as the API returns them, and turned into Comment objects.
+The memory they hold on to is measured with tracemalloc. Nothing is sent to
+the server, but a configuration file is needed. Usage:
+
+    python benchmarks/bench_object_memory.py [COMMENTS [AUTHORS]] [-c CONFIG]
+"""
+
+from __future__ import annotations
+
+import gc
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# The remaining arguments are for congruence.args, which parses the command
+# line when it is imported
+numbers = []
+while len(sys.argv) > 1 and sys.argv[1].isdigit():
+    numbers.append(int(sys.argv.pop(1)))
+COMMENTS, AUTHORS = (numbers + [5000, 8][len(numbers) :])[:2]
+
+import congruence.app  # noqa: E402
+
+# congruence.interface refers to the running application, which is not needed
+congruence.app.app = None  # type: ignore[attr-defined]
+
+from congruence.logging import log  # noqa: E402
+from congruence.objects import Comment  # noqa: E402
+
+
+def make_user(i: int) -> dict:
+    return {
+        "type": "known",
+        "username": f"user{i}",
+        "userKey": f"8a7f80{i:010x}",
+        "displayName": f"User Number {i}",
+        "profilePicture": {"path": f"/images/icons/profilepics/{i}.svg", "width": 48, "height": 48},
+        "_links": {"self": f"https://confluence.example.com/rest/api/user?key=8a7f80{i:010x}"},
+    }
+
+
+def make_comment(i: int) -> dict:
+    user = make_user(i % AUTHORS)
+    return {
+        "id": str(100000 + i),
+        "type": "comment",
+        "status": "current",
+        "title": "Re: Design discussion",
+        "space": {"id": 42, "key": "DEV", "name": "Development", "type": "global"},
+        "history": {
+            "createdBy": user,
+            "createdDate": "2024-03-01T12:00:00.000+01:00",
+            "lastUpdated": {"by": user, "when": "2024-03-01T12:00:00.000+01:00", "number": 1},
+        },
+        "version": {"by": user, "when": "2024-03-01T12:00:00.000+01:00", "number": 1, "message": ""},
+        "ancestors": [{"id": str(100000 + i // 2)}] if i else [],
+        "container": {"id": "99", "title": "Design discussion", "_links": {"webui": "/display/DEV/Design"}},
+        "extensions": {"location": "footer"},
+        "body": {"view": {"value": f"<p>Comment number {i}</p>"}},
+        "_links": {"webui": f"/display/DEV/Design?focusedCommentId={100000 + i}"},
+    }
+
+
+def main() -> None:
+    # The API sends each comment as text; decoding gives every one its own dicts
+    payloads = [json.dumps(make_comment(i)) for i in range(COMMENTS)]
+    # The debug log is kept in memory and would be measured as well
+    log.setLevel(logging.INFO)
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    comments = [Comment(json.loads(p)) for p in payloads]
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{len(comments)} comments by {AUTHORS} authors")
+    print(f"{size / 2**20:.1f} MiB, {size / len(comments):.0f} bytes per comment")
+    print(f"{elapsed * 1000:.0f} ms to build (with tracemalloc)")
+
+
+if __name__ == "__main__":
+    main()
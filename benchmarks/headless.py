@@ -0,0 +1,49 @@
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Run congruence in a benchmark without starting the urwid application."""
+
+from __future__ import annotations
+
+import os
+import sys
+from typing import Any
+
+
+class HeadlessApp:
+    """Stands in for the urwid application, which the benchmarks do not start."""
+
+    def alert(self, message: str, msgtype: str = "info") -> None:
+        pass
+
+    def reset_status(self) -> None:
+        pass
+
+
+def setup(config_file: str = "", **settings: Any) -> None:
+    """Load the configuration from *config_file* and install a HeadlessApp.
+
+    :settings: override values of the configuration, e.g. CacheSize=0
+    """
+    sys.argv = [sys.argv[0]] + (["-c", config_file] if config_file else [])
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+    from congruence.args import config
+
+    # Before anything reads them, e.g. the interface when it is imported
+    config.update(settings)
+    import congruence.app
+
+    congruence.app.app = HeadlessApp()  # type: ignore[attr-defined]
@@ -14,11 +14,19 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-#  from congruence.args import config
-from congruence.app import CongruenceApp
+# Imported first so that the startup profile includes all other imports
+from congruence import startup
 
 
 def main():
+    # Imported here rather than at the top: render processes import this
+    # module again when they are spawned, and must neither read the
+    # configuration nor set up logging. The configuration comes first,
+    # since everything else depends on it.
+    import congruence.args  # noqa: F401
+    from congruence.app import CongruenceApp
+
+    startup.mark("imports")
     try:
         CongruenceApp().main()
     except KeyboardInterrupt:
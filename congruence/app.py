@@ -16,18 +16,22 @@
 
 from __future__ import annotations
 
+import sys
 from collections.abc import Callable
-from typing import ClassVar
+from typing import Any, ClassVar
 
 import urwid
 
-from congruence.args import config
+from congruence import startup
+from congruence.args import args, config
 from congruence.external import get_editor_input
 from congruence.keys import KEY_ACTIONS, KEYS
-from congruence.logging import log, log_stream
+from congruence.logging import log, log_buffer
 from congruence.palette import PALETTE
-from congruence.views.common import CongruenceTextBox, CongruenceView
+from congruence.views.common import CongruenceTextBox, CongruenceView, LoadingView, NotCachedView
 from congruence.views.mainmenu import CongruenceMainMenu
+from congruence.views.metrics import MetricsView
+from congruence.workers import BackgroundWorker, on_main_thread
 
 
 class CongruenceFooter(urwid.Pile):
@@ -75,7 +79,7 @@ class HelpView(CongruenceTextBox):
 class CongruenceApp:
     """Top-level application object."""
 
-    key_actions: ClassVar[list[str]] = ["show help", "back", "exit", "show log"]
+    key_actions: ClassVar[list[str]] = ["show help", "back", "exit", "show log", "show metrics"]
 
     def unhandled_input(self, key: str | tuple) -> None:
         if not isinstance(key, str) or key not in KEY_ACTIONS:
@@ -91,11 +95,12 @@ class CongruenceApp:
         elif action == "exit":
             self.exit()
         elif action == "show log":
-            log_text = log_stream.getvalue()
-            log.debug(log_text)
-            view = CongruenceTextBox(log_text)
+            view = CongruenceTextBox(log_buffer.getvalue())
             view.title = "Log"
             self.push_view(view)
+        elif action == "show metrics":
+            if not isinstance(self.get_current_widget(), MetricsView):
+                self.push_view(MetricsView())
 
     def __init__(self) -> None:
         global app
@@ -104,10 +109,12 @@ class CongruenceApp:
 
         self._view_stack: list = []
         self._title_stack: list[str] = []
+        self.workers = BackgroundWorker(config["Workers"])
 
         self.body = CongruenceMainMenu(config["Plugins"])
         self.title = "Congruence"
-        self.header = urwid.Text(self.title)
+        self.offline: bool = args.offline
+        self.header = urwid.Text(self.get_full_title())
         self.footer = CongruenceFooter()
         self.view = urwid.Frame(
             self.body,
@@ -118,7 +125,16 @@ class CongruenceApp:
         self.active = True
 
     def get_full_title(self) -> str:
-        return " / ".join([self.title, *self._title_stack])
+        title = f"{self.title} [offline]" if self.offline else self.title
+        return " / ".join([title, *self._title_stack])
+
+    def set_offline(self, offline: bool) -> None:
+        """Mark in the title whether content is shown from the cache only."""
+        if not on_main_thread():
+            self.workers.call_soon(self.set_offline, offline)
+            return
+        self.offline = offline
+        self.header.set_text(("head", self.get_full_title()))
 
     def get_current_widget(self) -> CongruenceView:
         return self.loop.widget.body  # type: ignore[return-value,union-attr]
@@ -126,6 +142,10 @@ class CongruenceApp:
     def alert(self, message: str, msgtype: str = "info") -> None:
         """Display *message* in the status line with style *msgtype*."""
         log.info(f"Alert ({msgtype}): {message}")
+        # urwid is not thread-safe; hand over to the main loop
+        if not on_main_thread():
+            self.workers.call_soon(self.alert, message, msgtype)
+            return
         self.footer.status_line.set_text((msgtype, message))
         try:
             self.loop.draw_screen()
@@ -133,6 +153,9 @@ class CongruenceApp:
             pass
 
     def reset_status(self) -> None:
+        if not on_main_thread():
+            self.workers.call_soon(self.reset_status)
+            return
         self.footer.status_line.set_text(("info", ""))
         try:
             self.loop.draw_screen()
@@ -141,6 +164,9 @@ class CongruenceApp:
 
     def get_input(self, prompt: str, callback: Callable[[str], None]) -> None:
         """Show an inline edit field in the footer and call *callback* on Enter."""
+        if not on_main_thread():
+            self.workers.call_soon(self.get_input, prompt, callback)
+            return
         footer = self.view.get_footer().widget_list[1]
 
         def handler(widget: urwid.Edit, text: str) -> None:
@@ -169,15 +195,114 @@ class CongruenceApp:
         self.loop.widget.body = view  # type: ignore[union-attr]
         self.header.set_text(("head", self.get_full_title()))
         self.footer.update_keylegend(view.key_actions)
+        view.shown()
+
+    def replace_view(self, old: CongruenceView, new: CongruenceView) -> bool:
+        """Put *new* where *old* is on the view stack; False if *old* is gone."""
+        title = getattr(new, "title", "untitled")
+        if self.loop.widget.body is old:  # type: ignore[union-attr]
+            old.cancel_token.cancel()
+            self._title_stack[-1] = title
+            self.loop.widget.body = new  # type: ignore[union-attr]
+            self.header.set_text(("head", self.get_full_title()))
+            self.footer.update_keylegend(new.key_actions)
+            new.shown()
+            return True
+        for i, view in enumerate(self._view_stack):
+            if view is old:
+                old.cancel_token.cancel()
+                self._view_stack[i] = new
+                self._title_stack[i - 1] = title
+                return True
+        return False
+
+    def remove_view(self, view: CongruenceView) -> None:
+        """Remove *view* from the view stack, wherever it is."""
+        if self.loop.widget.body is view:  # type: ignore[union-attr]
+            self.pop_view()
+            return
+        for i, v in enumerate(self._view_stack):
+            if v is view and i > 0:
+                view.cancel_token.cancel()
+                del self._view_stack[i]
+                del self._title_stack[i - 1]
+                return
+
+    def show_error(self, e: Exception) -> None:
+        # Not imported at the top, the cache pulls in requests
+        from congruence.cache import NotCachedError
+
+        if isinstance(e, NotCachedError):
+            self.alert(str(e), "warning")
+            return
+        self.alert(f"{type(e).__name__}: {e}", "error")
+
+    def run_in_background(
+        self,
+        job: Callable[[], Any],
+        callback: Callable[[Any], None] | None = None,
+        errback: Callable[[Exception], None] | None = None,
+    ) -> None:
+        """Run *job* off the main loop and pass its result to *callback*.
+
+        The job belongs to the current view: when that view is closed, the
+        job is cancelled and its result discarded. When called from a
+        background thread, e.g. while a view is being built by
+        push_view_async, the job simply runs inline.
+        """
+        if not on_main_thread():
+            result = job()
+            if callback is not None:
+                callback(result)
+            return
+        token = self.get_current_widget().cancel_token
+        self.workers.submit(job, callback, errback or self.show_error, token)
+
+    def push_view_async(
+        self,
+        builder: Callable[[], CongruenceView | None],
+        errback: Callable[[Exception], None] | None = None,
+    ) -> None:
+        """Show a placeholder and replace it by the view *builder* returns.
+
+        The builder runs in the background. If the user leaves the
+        placeholder before the view is ready, the result is discarded.
+        """
+        if not on_main_thread():
+            self.workers.call_soon(self.push_view_async, builder, errback)
+            return
+        placeholder = LoadingView()
+        self.push_view(placeholder)
+
+        def done(view: CongruenceView | None) -> None:
+            if view is None:
+                self.remove_view(placeholder)
+            elif not self.replace_view(placeholder, view):
+                log.debug(f"Discarding view '{getattr(view, 'title', 'untitled')}'")
+                # Stop what it is still loading
+                view.cancel_token.cancel()
+
+        def failed(e: Exception) -> None:
+            from congruence.cache import NotCachedError
+
+            if isinstance(e, NotCachedError):
+                self.replace_view(placeholder, NotCachedView(e))
+                return
+            self.remove_view(placeholder)
+            (errback or self.show_error)(e)
+
+        self.workers.submit(builder, done, failed, placeholder.cancel_token)
 
     def pop_view(self) -> None:
         """Restore the previous view, or exit if the stack is empty."""
         if self._view_stack:
+            self.get_current_widget().cancel_token.cancel()
             view = self._view_stack.pop()
             self._title_stack.pop()
             self.loop.widget.body = view  # type: ignore[union-attr]
             self.header.set_text(("head", self.get_full_title()))
             self.footer.update_keylegend(view.key_actions)
+            view.shown()
         else:
             self.exit()
 
@@ -185,12 +310,35 @@ class CongruenceApp:
         self.active = False
         raise urwid.ExitMainLoop()
 
+    def first_paint(self, loop: urwid.MainLoop, user_data: Any = None) -> None:
+        """Draw the main menu, then do what startup has left to do."""
+        loop.draw_screen()
+        startup.mark("first paint")
+        self.workers.submit(self.warm_up, errback=lambda e: log.exception(e))
+
+    def warm_up(self) -> None:
+        """Prepare in the background what the first view will need."""
+        from congruence import interface
+
+        startup.mark("interface")
+        interface.start_session()
+        startup.mark("session")
+        self.body.preload()
+        interface.preload_modules()
+        startup.mark("modules")
+        log.info(f"Startup profile:\n{startup.report()}")
+
     def main(self) -> None:
         """Run the urwid event loop, restarting after caught exceptions."""
         self.loop = urwid.MainLoop(self.view, PALETTE, unhandled_input=self.unhandled_input)
+        self.workers.attach(self.loop)
+        startup.mark("main menu")
+        self.loop.set_alarm_in(0, self.first_paint)
         while self.active:
             try:
                 self.loop.run()
             except Exception as e:
                 log.exception(e)
                 self.alert(f"{type(e).__name__}: {e}", "error")
+        if args.profile_startup:
+            print(startup.report(), file=sys.stderr)
@@ -24,6 +24,7 @@ import xdg.BaseDirectory
 import yaml
 
 from congruence.__init__ import __version__
+from congruence.startup import mark
 
 parser = argparse.ArgumentParser(
     description="A command line interface for Confluence (by Adrian Vollmer)"
@@ -44,6 +45,13 @@ parser.add_argument(
     help="enable logging to a file in $XDG_DATA_HOME/congruence",
 )
 
+parser.add_argument(
+    "--log-payloads",
+    default=False,
+    action="store_true",
+    help="also log the data of every object received from the API (verbose)",
+)
+
 parser.add_argument(
     "-d",
     "--dump-http",
@@ -60,6 +68,44 @@ parser.add_argument(
     help="specify a configuration file",
 )
 
+parser.add_argument(
+    "-o",
+    "--offline",
+    default=False,
+    action="store_true",
+    help="do not contact the server; show what is in the local cache",
+)
+
+parser.add_argument(
+    "--profile-startup",
+    default=False,
+    action="store_true",
+    help="report how long each phase of startup took when exiting",
+)
+
+parser.add_argument(
+    "--record",
+    type=str,
+    default=None,
+    metavar="FILE",
+    help="record all requests and responses to a file that can be replayed with --replay",
+)
+
+parser.add_argument(
+    "--replay",
+    type=str,
+    default=None,
+    metavar="FILE",
+    help="answer requests from a recording instead of the server, without the HTTP cache",
+)
+
+parser.add_argument(
+    "--replay-latency",
+    default=False,
+    action="store_true",
+    help="with --replay, take as long for each request as it took when it was recorded",
+)
+
 args = parser.parse_args()
 
 data_home: str = xdg.BaseDirectory.save_data_path("congruence")
@@ -100,6 +146,21 @@ DEFAULTS: dict = {
     "CliBrowser": "elinks",
     "GuiBrowser": "firefox",
     "ImageViewer": "feh",
+    "CacheSize": 100,
+    "RenderCacheEntries": 5000,
+    "RenderCacheSize": 0,
+    "RenderProcesses": os.cpu_count() or 1,
+    "MaxConnections": 8,
+    "MaxConnectionsPerHost": 4,
+    "PrefetchConcurrency": 2,
+    "PrefetchSize": 16,
+    "Workers": 4,
+    "KeepaliveInterval": 300,
+    "CompressLog": False,
+    "LogLines": 10000,
+    "MaxLogSize": 0,
+    "MaxDumpSize": 0,
+    "RotatedFiles": 3,
 }
 
 for key, value in DEFAULTS.items():
@@ -110,3 +171,5 @@ HOST: str = config["Host"]
 PROTO: str = config["Protocol"]
 BASE_URL: str = f"{PROTO}://{HOST}"
 LOG_FILE: str = os.path.join(data_home, "congruence.log")
+
+mark("config")
@@ -0,0 +1,428 @@
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Persistent HTTP cache for GET responses.
+
+Entries are stored as a pair of files below the cache directory: the raw
+response body and a small JSON file with the status, headers and the
+validators (ETag, Last-Modified) needed for revalidation. The total size of
+all bodies is kept below a budget by evicting the least recently used
+entries.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import BinaryIO
+
+from requests import PreparedRequest, Response
+from requests.structures import CaseInsensitiveDict
+
+from congruence.logging import log
+
+# Headers that describe the transfer rather than the body, or must not be replayed
+SKIPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "set-cookie", "connection"}
+
+
+class NotCachedError(Exception):
+    """Raised while offline for a request the cache cannot answer."""
+
+
+class DiskLRU:
+    """Index of the entries of an on-disk cache that evicts the least
+    recently used ones.
+
+    An entry is a file named after its key and *suffix*, written to
+    temp_path() first and then moved into place. Only its size counts
+    towards the budget; files with the *companions* suffixes belong to it
+    and are removed along with it. The index is built from the directory
+    when it is first needed.
+
+    :directory: where the entries are stored
+    :max_size: budget for the sum of all entry sizes in bytes
+    """
+
+    def __init__(self, directory: str, max_size: int, suffix: str, companions: tuple[str, ...] = ()) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.suffix = suffix
+        self.companions = companions
+        self.evictions = 0
+        self._size = 0
+        self._lock = threading.Lock()
+        # key -> [size, last access]
+        self._index: dict[str, list] | None = None
+
+    def path(self, key: str, suffix: str | None = None) -> str:
+        return os.path.join(self.directory, f"{key}{self.suffix if suffix is None else suffix}")
+
+    def temp_path(self, key: str) -> str:
+        """Return a file name for writing the entry *key* in this thread."""
+        with self._lock:
+            # Before the file exists, which loading the index would remove
+            self._load()
+        return f"{self.path(key)}.{threading.get_ident()}.tmp"
+
+    def _load(self) -> dict[str, list]:
+        # Called with the lock held
+        if self._index is not None:
+            return self._index
+        self._index = {}
+        os.makedirs(self.directory, exist_ok=True)
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".tmp"):
+                # Left behind by an interrupted write
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+                continue
+            if not entry.name.endswith(self.suffix):
+                continue
+            key = entry.name[: -len(self.suffix)]
+            if not all(os.path.exists(self.path(key, s)) for s in self.companions):
+                continue
+            stat = entry.stat()
+            self._index[key] = [stat.st_size, stat.st_mtime]
+            self._size += stat.st_size
+        return self._index
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._load()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load())
+
+    @property
+    def size(self) -> int:
+        """Sum of the sizes of all entries."""
+        with self._lock:
+            self._load()
+            return self._size
+
+    def add(self, key: str, size: int) -> None:
+        """Index the entry *key*, which has just been moved into place, and
+        evict old entries if the budget is exceeded."""
+        with self._lock:
+            index = self._load()
+            old = index.get(key)
+            if old:
+                self._size -= old[0]
+            index[key] = [size, time.time()]
+            self._size += size
+            if self._size <= self.max_size:
+                return
+            victims = []
+            for k in sorted(index, key=lambda k: index[k][1]):
+                if self._size <= self.max_size:
+                    break
+                self._size -= index.pop(k)[0]
+                victims.append(k)
+            self.evictions += len(victims)
+        for k in victims:
+            self._delete(k)
+        log.debug(f"Evicted {len(victims)} entries from {self.directory}")
+
+    def touch(self, key: str) -> bool:
+        """Mark the entry *key* as used; return whether it exists."""
+        with self._lock:
+            index = self._load()
+            if key not in index:
+                return False
+            now = index[key][1] = time.time()
+        try:
+            # Keeps the order of use across restarts
+            os.utime(self.path(key), (now, now))
+        except OSError:
+            pass
+        return True
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            old = self._load().pop(key, None)
+            if old:
+                self._size -= old[0]
+        self._delete(key)
+
+    def _delete(self, key: str) -> None:
+        for suffix in (self.suffix, *self.companions):
+            try:
+                os.remove(self.path(key, suffix))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                log.error(f"Could not remove cache entry: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            keys = list(self._load())
+        for key in keys:
+            self.remove(key)
+
+
+class CacheEntry:
+    """Metadata of a cached response; the body is read from disk on demand."""
+
+    def __init__(self, key: str, meta: dict, body_path: str) -> None:
+        self.key = key
+        self.url: str = meta.get("url", "")
+        self.status: int = meta.get("status", 200)
+        self.headers: dict = meta.get("headers", {})
+        self.stored: float = meta.get("stored", 0.0)
+        self.body_path = body_path
+
+    @property
+    def etag(self) -> str | None:
+        return CaseInsensitiveDict(self.headers).get("ETag")
+
+    @property
+    def last_modified(self) -> str | None:
+        return CaseInsensitiveDict(self.headers).get("Last-Modified")
+
+    def validators(self) -> dict[str, str]:
+        """Return the conditional request headers for this entry."""
+        result = {}
+        if self.etag:
+            result["If-None-Match"] = self.etag
+        if self.last_modified:
+            result["If-Modified-Since"] = self.last_modified
+        return result
+
+    def read_body(self) -> bytes | None:
+        """Return the body, or None if it was evicted in the meantime."""
+        try:
+            with open(self.body_path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+def cacheable(response: Response) -> bool:
+    """Return whether *response* may be stored at all.
+
+    This is a private cache, so `private` responses are kept; `no-store`
+    ones are not.
+    """
+    directives = response.headers.get("Cache-Control", "")
+    return "no-store" not in (d.split("=")[0].strip().lower() for d in directives.split(","))
+
+
+class CacheWriter:
+    """Collects a response body on disk; the entry exists once committed.
+
+    Bodies that grow larger than the whole cache are silently dropped, and
+    responses that must not be stored replace nothing.
+    """
+
+    def __init__(self, cache: HTTPCache, key: str, response: Response) -> None:
+        self.cache = cache
+        self.key = key
+        self.response = response
+        self.size = 0
+        self._path = cache._lru.temp_path(key)
+        self._file: BinaryIO | None = None
+        if not cacheable(response):
+            # A stale entry must not outlive the server's change of mind
+            cache._lru.remove(key)
+            return
+        try:
+            self._file = open(self._path, "wb")
+        except OSError as e:
+            log.error(f"Could not write cache entry: {e}")
+
+    def write(self, chunk: bytes) -> None:
+        if self._file is None:
+            return
+        self.size += len(chunk)
+        if self.size > self.cache.max_size:
+            self.abort()
+            return
+        try:
+            self._file.write(chunk)
+        except OSError as e:
+            log.error(f"Could not write cache entry: {e}")
+            self.abort()
+
+    def commit(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        self.cache._commit(self.key, self.response, self._path, self.size)
+
+    def abort(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        try:
+            os.remove(self._path)
+        except OSError:
+            pass
+
+
+class HTTPCache:
+    """Size-bounded on-disk cache with LRU eviction.
+
+    :directory: where entries are stored
+    :max_size: budget for the sum of all body sizes in bytes
+    """
+
+    def __init__(self, directory: str, max_size: int) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._lock = threading.Lock()
+        # Bodies, each with its metadata in a .json file next to it
+        self._lru = DiskLRU(directory, max_size, ".body", (".json",))
+
+    def _meta_path(self, key: str) -> str:
+        return self._lru.path(key, ".json")
+
+    def _body_path(self, key: str) -> str:
+        return self._lru.path(key)
+
+    @staticmethod
+    def key(url: str, params: dict | None = None) -> str:
+        """Derive a cache key from the URL and the (order independent) parameters."""
+        request = PreparedRequest()
+        request.prepare_url(url, sorted((params or {}).items()))
+        return hashlib.sha256((request.url or url).encode()).hexdigest()
+
+    def lookup(self, key: str) -> CacheEntry | None:
+        if key not in self._lru:
+            return None
+        try:
+            with open(self._meta_path(key)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            self._lru.remove(key)
+            return None
+        return CacheEntry(key, meta, self._body_path(key))
+
+    def store(self, key: str, response: Response) -> None:
+        """Write *response* to disk and evict old entries if necessary."""
+        body = response.content
+        if len(body) > self.max_size:
+            return
+        writer = self.writer(key, response)
+        writer.write(body)
+        writer.commit()
+
+    def writer(self, key: str, response: Response) -> CacheWriter:
+        """Return a writer for storing the body of *response* chunk by chunk."""
+        return CacheWriter(self, key, response)
+
+    def _commit(self, key: str, response: Response, tmp_path: str, size: int) -> None:
+        meta = {
+            "url": response.url,
+            "status": response.status_code,
+            "headers": {k: v for k, v in response.headers.items() if k.lower() not in SKIPPED_HEADERS},
+            "stored": time.time(),
+        }
+        try:
+            os.replace(tmp_path, self._body_path(key))
+            with open(self._meta_path(key), "w") as f:
+                json.dump(meta, f)
+        except OSError as e:
+            log.error(f"Could not write cache entry: {e}")
+            return
+        with self._lock:
+            self.stores += 1
+        self._lru.add(key, size)
+
+    def refresh(self, entry: CacheEntry, response: Response) -> Response | None:
+        """Build a full response from *entry* after the server answered 304.
+
+        The returned object carries the request and timing of *response*, so
+        it can be used like any other response. None means the body was
+        evicted since the lookup and the request has to be repeated without
+        validators.
+        """
+        result = self.response(entry)
+        if result is None:
+            return None
+        headers = result.headers
+        # A 304 may come with updated validators
+        for h in ("ETag", "Last-Modified", "Date", "Expires", "Cache-Control"):
+            if h in response.headers:
+                headers[h] = response.headers[h]
+        result.url = response.url
+        result.request = response.request
+        result.elapsed = response.elapsed
+        now = time.time()
+        if headers != CaseInsensitiveDict(entry.headers):
+            entry.headers = dict(headers)
+            try:
+                with open(self._meta_path(entry.key), "w") as f:
+                    json.dump(
+                        {"url": entry.url, "status": entry.status, "headers": entry.headers, "stored": now},
+                        f,
+                    )
+            except OSError as e:
+                log.error(f"Could not update cache entry: {e}")
+        self._lru.touch(entry.key)
+        if not cacheable(result):
+            self._lru.remove(entry.key)
+        with self._lock:
+            self.hits += 1
+        log.debug(f"Cache hit: {response.url}")
+        return result
+
+    def response(self, entry: CacheEntry) -> Response | None:
+        """Build a response from *entry* without asking the server.
+
+        Return None if the body was evicted since the lookup.
+        """
+        body = entry.read_body()
+        if body is None:
+            self._lru.remove(entry.key)
+            return None
+        result = Response()
+        result.status_code = entry.status
+        result.reason = "OK"
+        result.headers = CaseInsensitiveDict(entry.headers)
+        result._content = body
+        result._content_consumed = True  # type: ignore[attr-defined]
+        result.url = entry.url
+        result.encoding = "utf-8"
+        return result
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def clear(self) -> None:
+        self._lru.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self._lru.evictions,
+                "entries": len(self._lru),
+                "size": self._lru.size,
+            }
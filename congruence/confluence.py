@@ -18,20 +18,21 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Any
+from collections.abc import Callable, Iterator
+from typing import Any
 
 import congruence.strings as cs
 from congruence.external import open_doc_in_cli_browser, open_gui_browser
-from congruence.interface import convert_date, make_request
+from congruence.interface import convert_date, fetch_many, make_request, prerender, stream_results
+from congruence.jsonstream import batched
 from congruence.logging import log
-from congruence.objects import Comment, Content, ContentWrapper
+from congruence.objects import Comment, Content, ContentWrapper, fetch_body
+from congruence.profiles import content_request, expand
 from congruence.tools import create_diff
 from congruence.views.common import CongruenceTextBox, key_action
 from congruence.views.listbox import ColumnListBoxEntry, CongruenceListBox
 from congruence.views.treelistbox import CongruenceCardTreeWidget, CongruenceTreeListBox
-
-if TYPE_CHECKING:
-    pass
+from congruence.workers import check_cancelled
 
 
 def _find_child_by_id(children: list[dict], cid: str) -> dict | None:
@@ -42,41 +43,78 @@ def _find_child_by_id(children: list[dict], cid: str) -> dict | None:
     return None
 
 
+def _insert_comment(tree: list[dict], c: dict) -> Comment:
+    """Add comment *c* below the last of its ancestors present in *tree*."""
+    # Confluence returns a flat list where each item carries its ancestor chain.
+    # Reconstruct the nested tree structure.
+    parent = tree
+    for ancestor in reversed(c["ancestors"]):
+        node = _find_child_by_id(parent, ancestor["id"])
+        if node is None:
+            break
+        parent = node["children"]
+    comment = Comment.resolve(c)
+    parent.append({c["id"]: comment, "children": []})
+    return comment
+
+
+def comments_request(page_id: str) -> dict:
+    """Return make_request arguments for the first page of comments of *page_id*."""
+    return {
+        "url": f"rest/api/content/{page_id}/child/comment",
+        "params": {
+            "expand": expand("comments"),
+            "depth": "all",
+            "limit": 9999,
+        },
+    }
+
+
+def content_prefetch_requests(obj: ContentWrapper) -> list[dict]:
+    """Return what the next view of a search result will request."""
+    if obj.type in ("page", "blogpost"):
+        return [content_request(obj.content.id, "body")]
+    if obj.type == "comment":
+        return [comments_request(obj.parent_url.split("=")[-1])]
+    return []
+
+
 def get_comments_of_page(page_id: str) -> list[dict]:
     """Retrieve the comment tree of *page_id* from the Confluence API."""
     log.debug(f"Get comment tree of page {page_id}")
 
-    url = f"rest/api/content/{page_id}/child/comment"
-    params: dict[str, Any] = {
-        "expand": "body.view,content,history.lastUpdated,version,ancestors,extensions.inlineProperties,version",
-        "depth": "all",
-        "limit": 9999,
-    }
-
-    items: list[dict] = []
-    while True:
-        r = make_request(url, params=params)
-        parsed = r.json()
-        items += parsed["results"]
-        links = parsed["_links"]
-        if "next" in links:
-            url = links["next"]
-        else:
-            break
+    request = comments_request(page_id)
+    url: str = request["url"]
+    params: dict[str, Any] = request["params"]
 
+    # Comments are decoded and put into the tree while the response arrives
+    r, comments = stream_results(url, params=params)
+    r.raise_for_status()
     result: list[dict] = []
-    # Confluence returns a flat list where each item carries its ancestor chain.
-    # Reconstruct the nested tree structure.
-    for c in items:
-        parent = result
-        for ancestor in reversed(c["ancestors"]):
-            node = _find_child_by_id(parent, ancestor["id"])
-            if node is None:
-                break
-            parent = node["children"]
-
-        parent.append({c["id"]: Comment(c), "children": []})
-
+    inserted = [_insert_comment(result, c) for c in comments]
+    parsed = comments.envelope
+    links = parsed["_links"]
+    # If there is a next page, the server capped the page size and the first
+    # page is full. Knowing the total, all remaining pages can be requested at
+    # once; fetch_many preserves their order.
+    page_size = comments.count
+    if "next" in links and "totalSize" in parsed and page_size:
+        specs = [
+            {"url": url, "params": {**params, "start": start, "limit": page_size}}
+            for start in range(parsed.get("start", 0) + page_size, parsed["totalSize"], page_size)
+        ]
+        for r in fetch_many(specs):
+            inserted += [_insert_comment(result, c) for c in r.json()["results"]]
+    else:
+        while "next" in links:
+            r = make_request(links["next"])
+            parsed = r.json()
+            inserted += [_insert_comment(result, c) for c in parsed["results"]]
+            links = parsed["_links"]
+
+    # Long threads are converted to text in parallel instead of while drawing
+    prerender([c.body_html for c in inserted if not c.blacklisted], replace_emoticons=True)
+    check_cancelled()
     return result
 
 
@@ -133,11 +171,9 @@ class CommentContextView(CongruenceTreeListBox):
     @key_action
     def cli_browser(self, size: tuple | None = None) -> None:
         obj = self.focus.get_value()  # type: ignore[union-attr]
-        try:
-            obj_id = obj.id
-        except AttributeError:
-            obj_id = obj["id"]
-        open_content_in_cli_browser(self.app, obj_id)
+        if isinstance(obj, dict):
+            obj = obj["id"]
+        open_content_in_cli_browser(self.app, obj)
 
     @key_action
     def gui_browser(self, size: tuple | None = None) -> None:
@@ -197,21 +233,20 @@ class PageView(CongruenceTextBox):
             "Last change message": c.version_message,
             "Version number": str(c.version_number),
         }
+        if c.latest_version > c.version_number:
+            infos["Latest version seen"] = str(c.latest_version)
         text = "\n".join(f"{k}: {v}" for k, v in infos.items())
         help_string = cs.PAGE_VIEW_HELP
         super().__init__(text, help_string=help_string)
 
     @key_action
     def list_diff(self, size: tuple | None = None) -> None:
-        try:
-            view = DiffView(self.obj.content.id)
-            self.app.push_view(view)
-        except KeyError:
-            self.app.alert("No diff available", "warning")
+        page_id = self.obj.content.id
+        self.app.push_view_async(lambda: DiffView(page_id), errback=diff_failed)
 
     @key_action
     def cli_browser(self, size: tuple | None = None) -> None:
-        open_content_in_cli_browser(self.app, self.obj.content.id)
+        open_content_in_cli_browser(self.app, self.obj.content)
 
     @key_action
     def gui_browser(self, size: tuple | None = None) -> None:
@@ -221,8 +256,7 @@ class PageView(CongruenceTextBox):
     @key_action
     def go_to_comments(self, size: tuple | None = None) -> None:
         page_id = self.obj.content.id
-        view = CommentContextView(page_id, self.obj)
-        self.app.push_view(view)
+        self.app.push_view_async(lambda: CommentContextView(page_id, self.obj))
 
     @key_action
     def like(self, size: tuple | None = None) -> None:
@@ -240,13 +274,24 @@ class DiffView(CongruenceTextBox):
         self.page_id = page_id
         self.title = "Diff"
         url = f"rest/api/content/{page_id}"
-        params: dict[str, Any] = {"expand": "version,body.view"}
-
+        params: dict[str, Any] = {"expand": expand("version", "body")}
+        first_params = dict(params)
         if first is not None:
-            params["status"] = "historical"
-            params["version"] = first
-        r = make_request(url, params=params)
-        data = r.json()
+            first_params["status"] = "historical"
+            first_params["version"] = first
+
+        if first is not None and second is not None:
+            # Both version numbers are known, so fetch them side by side
+            second_params = {**params, "status": "historical", "version": second}
+            r1, r2 = fetch_many([{"url": url, "params": first_params}, {"url": url, "params": second_params}])
+            data = r1.json()
+        else:
+            r1 = make_request(url, params=first_params)
+            data = r1.json()
+            version = data["version"]["number"] - 1 if second is None else second
+            second_params = {**params, "status": "historical", "version": version}
+            r2 = make_request(url, params=second_params)
+
         self.first: int = data["version"]["number"]
         self.version1: str = data["body"]["view"]["value"]
         tofile = (
@@ -255,12 +300,8 @@ class DiffView(CongruenceTextBox):
             f"{convert_date(data['version']['when'])}"
         )
 
-        self.second: int = (self.first - 1) if second is None else second
-        params["version"] = self.second
-        params["status"] = "historical"
-
-        r = make_request(url, params=params)
-        data = r.json()
+        self.second: int = second_params["version"]
+        data = r2.json()
         self.version2: str = data["body"]["view"]["value"]
         fromfile = (
             f"Version number {self.second} by "
@@ -276,21 +317,26 @@ class DiffView(CongruenceTextBox):
 
     @key_action
     def cycle_next(self, size: tuple | None = None) -> None:
-        try:
-            view = DiffView(self.page_id, self.first - 1, self.second - 1)
-            self.app.pop_view()
-            self.app.push_view(view)
-        except KeyError:
-            self.app.alert("No diff available", "warning")
+        self._cycle(-1)
 
     @key_action
     def cycle_prev(self, size: tuple | None = None) -> None:
-        try:
-            view = DiffView(self.page_id, self.first + 1, self.second + 1)
-            self.app.pop_view()
-            self.app.push_view(view)
-        except KeyError:
-            self.app.alert("No diff available", "warning")
+        self._cycle(1)
+
+    def _cycle(self, step: int) -> None:
+        first, second = self.first + step, self.second + step
+        self.app.run_in_background(
+            lambda: DiffView(self.page_id, first, second),
+            lambda view: self.app.replace_view(self, view),
+            diff_failed,
+        )
+
+
+def diff_failed(e: Exception) -> None:
+    if isinstance(e, KeyError):
+        CongruenceTextBox.app.alert("No diff available", "warning")
+    else:
+        CongruenceTextBox.app.show_error(e)
 
 
 class ContentList(CongruenceListBox):
@@ -310,30 +356,24 @@ class ContentList(CongruenceListBox):
     @key_action
     def load_more(self, size: tuple | None = None) -> None:
         log.info("Load more ...")
-        self.entries += self.get_entries()
-        self.redraw()
+        self.stream_entries(self.next_page())
 
     @key_action
     def load_much_more(self, size: tuple | None = None) -> None:
         log.info("Load much more ...")
-        self.params["limit"] *= 5
-        self.entries += self.get_entries()
-        self.params["limit"] //= 5
-        self.redraw()
+        self.stream_entries(self.next_page(limit=self.params["limit"] * 5))
 
     @key_action
     def update(self, size: tuple | None = None) -> None:
         log.info("Update ...")
-        self.params["start"] = 0
-        self.entries = self.get_entries()
-        self.redraw()
+        self.stream_entries(self.next_page(start=0), replace=True)
 
     @key_action
     def cli_browser(self, size: tuple | None = None) -> None:
         node = self.get_focus()[0]
         if node is None:
             return
-        open_content_in_cli_browser(self.app, node.obj.content.id)  # type: ignore[union-attr]
+        open_content_in_cli_browser(self.app, node.obj.content)  # type: ignore[union-attr]
 
     @key_action
     def gui_browser(self, size: tuple | None = None) -> None:
@@ -347,32 +387,52 @@ class ContentList(CongruenceListBox):
         url = f"pages/viewpage.action?pageId={obj_id}"
         open_gui_browser(url)
 
-    def get_entries(self) -> list:
-        r = make_request("rest/api/search", params=self.params)
-        result = []
-        response = r.json()
-        if r.ok and response:
-            for each in response["results"]:
+    def next_page(self, **overrides: Any) -> Callable[[], Iterator[list]]:
+        """Return a job for stream_entries that fetches the next page.
+
+        The parameters are copied now, so the job does not see changes made
+        while it runs. *overrides* replace some of them, e.g. `start=0` to
+        begin again from the top; except for `limit`, they become the
+        parameters of the list once the page has arrived.
+        """
+        params = {**self.params, **overrides}
+        return lambda: self.get_entries(params)
+
+    def get_entries(self, params: dict[str, Any]) -> Iterator[list]:
+        """Search for content and yield the entries in batches as they arrive."""
+        r, results = stream_results("rest/api/search", params=params)
+        if not r.ok:
+            return
+        count = 0
+        for batch in batched(results):
+            entries = []
+            for each in batch:
                 obj = ContentWrapper(each)
                 try:
                     if not getattr(obj.content, "blacklisted", False):
-                        result.append(self._entryclass(obj))
+                        entries.append(self._entryclass(obj))
                 except AttributeError:
-                    result.append(self._entryclass(obj))
-            self.app.alert(f"Received {len(result)} items", "info")
-            self.params["start"] += self.params["limit"]
-        return result
-
-
-def open_content_in_cli_browser(app: Any, obj_id: str) -> None:
+                    entries.append(self._entryclass(obj))
+            count += len(entries)
+            yield entries
+        self.app.alert(f"Received {count} items", "info")
+        following = {**params, "start": params["start"] + params["limit"]}
+        del following["limit"]
+        # self.params belongs to the main thread
+        self.app.workers.deliver(self.params.update, following)
+
+
+def open_content_in_cli_browser(app: Any, obj: Content | str) -> None:
+    """Show the body of *obj*, a content object or its ID, in the CLI browser."""
+    obj_id = obj if isinstance(obj, str) else obj.id
     log.debug(f"Build HTML view for page with id '{obj_id}'")
     if not obj_id:
         app.alert("Object has no ID", "error")
         return
-    r = make_request(f"rest/api/content/{obj_id}?expand=body.view")
-    if not r.ok:
-        app.alert(f"Request failed ({r.status_code})", "error")
-        return
-    content = r.json()["body"]["view"]["value"]
-    html = f"<!DOCTYPE html><html><head><meta charset='utf-8'></head><body>{content}</body></html>"
-    open_doc_in_cli_browser(html.encode(), app)
+
+    def show(content: str) -> None:
+        html = f"<!DOCTYPE html><html><head><meta charset='utf-8'></head><body>{content}</body></html>"
+        open_doc_in_cli_browser(html.encode(), app)
+
+    job = (lambda: fetch_body(obj_id)["view"]["value"]) if isinstance(obj, str) else obj.get_body
+    app.run_in_background(job, show)
@@ -0,0 +1,120 @@
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Convert the HTML of Confluence bodies to text.
+
+Emoticon images and links to pages that do not exist yet are rewritten in a
+single pass over an lxml tree, which is only built if the HTML contains any
+of them. The result goes to html2text.
+
+This module does not depend on the rest of congruence, so that worker
+processes can render without loading the configuration or the UI.
+"""
+
+from __future__ import annotations
+
+import re
+
+import html2text
+import lxml.html
+from lxml.etree import ParserError
+
+# CSS class of an emoticon image -> its replacement
+EMOTICONS: dict[str, str] = {
+    f"emoticon-{name}": text
+    for name, text in {
+        "smile": ":)",
+        "sad": ":(",
+        "cheeky": ":P",
+        "laugh": ":D",
+        "wink": ";)",
+        "thumbs-up": "👍",
+        "thumbs-down": "👎",
+        "light-on": "💡",
+        "warning": "❗",
+        "yellow-star": "⭐",
+        "tick": "✔️",
+        "cross": "❌",
+        "information": "ℹ️",  # noqa: RUF001
+        "plus": "➕",  # noqa: RUF001
+        "minus": "➖",  # noqa: RUF001
+        "question": "❓",
+        "heart": "❤️️",
+        "broken-heart": "💔",
+    }.items()
+}
+
+_page_id = re.compile("[0-9]+$")
+
+
+def html_to_text(html: str, replace_emoticons: bool = False, fix_creation_links: bool = False) -> str:
+    """Return *html* as Markdown-like text.
+
+    :replace_emoticons: replace emoticon images with smileys or emojis
+    :fix_creation_links: drop the page ID from links that create a page,
+        which differs for each time the page is rendered
+    """
+    emoticons = replace_emoticons and "emoticon" in html
+    links = fix_creation_links and "createlink" in html
+    if emoticons or links:
+        html = rewrite(html, emoticons, links)
+    return html2text.html2text(html).strip()
+
+
+def render_all(
+    bodies: list[str], replace_emoticons: bool = False, fix_creation_links: bool = False
+) -> list[str | None]:
+    """Render each of *bodies*; None for those that fail.
+
+    This is what worker processes run, see congruence.renderpool.
+    """
+    result: list[str | None] = []
+    for html in bodies:
+        try:
+            result.append(html_to_text(html, replace_emoticons, fix_creation_links))
+        except Exception:
+            result.append(None)
+    return result
+
+
+def rewrite(html: str, emoticons: bool, links: bool) -> str:
+    """Replace emoticons and fix creation links in one pass."""
+    try:
+        root = lxml.html.document_fromstring(html)
+    except ParserError:
+        return html
+    for element in list(root.iter("img", "a")):
+        classes = (element.get("class") or "").split()
+        if emoticons and element.tag == "img" and "emoticon" in classes:
+            replacement = next((EMOTICONS[c] for c in classes if c in EMOTICONS), None)
+            if replacement is not None:
+                _replace_with_text(element, replacement)
+        elif links and element.tag == "a" and "createlink" in classes:
+            element.set("href", _page_id.sub("", element.get("href", "")))
+    return lxml.html.tostring(root, encoding="unicode")
+
+
+def _replace_with_text(element: lxml.html.HtmlElement, text: str) -> None:
+    parent = element.getparent()
+    if parent is None:
+        return
+    text += element.tail or ""
+    previous = element.getprevious()
+    if previous is not None:
+        previous.tail = (previous.tail or "") + text
+    else:
+        parent.text = (parent.text or "") + text
+    parent.remove(element)
@@ -17,34 +17,156 @@
 from __future__ import annotations
 
 import json
+import os
 import re
+import threading
 import time
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, timedelta
 from datetime import datetime as dt
-from datetime import timedelta
+from functools import lru_cache
+from importlib import import_module
+from io import StringIO
 from shlex import split
 from subprocess import check_output
-from urllib.parse import urlencode
+from urllib.parse import parse_qs, urlencode, urlsplit
 
-import html2text
-import markdown
-import pytz
-from bs4 import BeautifulSoup
-from dateutil.parser import parse as dtparse
 from requests import Response, Session
+from requests.adapters import HTTPAdapter
 from requests.cookies import cookiejar_from_dict
+from requests.exceptions import ConnectionError as RequestConnectionError
+from requests.exceptions import RequestException
 from requests.utils import dict_from_cookiejar
 
 from congruence.app import app
-from congruence.args import BASE_URL, args, config, cookie_jar
+from congruence.args import BASE_URL, args, cache_home, config, cookie_jar
+from congruence.cache import HTTPCache, NotCachedError
+from congruence.jsonstream import JSONArrayStream
 from congruence.logging import log
+from congruence.metrics import RequestRecord, metrics
+from congruence.prefetch import Prefetcher
+from congruence.profiles import profile_name
+from congruence.rendercache import RenderCache, render_key
+from congruence.renderpool import RenderPool
+from congruence.replay import Recorder, ReplayAdapter
+from congruence.workers import Cancelled, CancelToken, check_cancelled, current_token, set_current_token
+from congruence.writer import BackgroundWriter
 
 session = Session()
 if "CA" in config:
     session.verify = config["CA"]
 if "Proxy" in config:
     session.proxies = {config["Protocol"]: config["Proxy"]}
+# Enough pooled connections for the batch workers to share one session
+for prefix in ("http://", "https://"):
+    session.mount(prefix, HTTPAdapter(pool_maxsize=config["MaxConnections"]))
+if args.replay:
+    replay_adapter = ReplayAdapter(args.replay, latency=args.replay_latency)
+    for prefix in ("http://", "https://"):
+        session.mount(prefix, replay_adapter)
+recorder: Recorder | None = Recorder(args.record) if args.record else None
+# A file name ending in .gz means compressed
+dump_writer: BackgroundWriter | None = None
+if args.dump_http:
+    dump_writer = BackgroundWriter(
+        args.dump_http,
+        compress=args.dump_http.endswith(".gz"),
+        max_size=int(config["MaxDumpSize"] * 2**20),
+        backups=config["RotatedFiles"],
+    )
 
 XSRF: str = ""
+# The saved session is loaded before the first request, not at import
+_session_loaded: bool = False
+_session_lock = threading.Lock()
+
+# Imported where they are used, which keeps them out of the startup path;
+# preload_modules imports them in the background once the UI is up
+LAZY_MODULES = ["congruence.htmltext", "bs4", "markdown"]
+
+# Bytes read at a time from streamed responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Serialises re-authentication; the generation tells a waiting thread
+# whether somebody else already refreshed the session in the meantime
+_auth_lock = threading.Lock()
+_auth_generation: int = 0
+# Cleared while the session is renewed; requests wait for it instead of
+# being sent with the expired session
+_session_ready = threading.Event()
+_session_ready.set()
+# After a failed login, do not run Password_Command again for a while
+AUTH_RETRY = 10
+_auth_failed: float = -AUTH_RETRY
+# When the server was last contacted, for the keepalive
+_last_request: float = 0.0
+
+_executor = ThreadPoolExecutor(max_workers=config["MaxConnections"], thread_name_prefix="fetch")
+_host_limits: dict[str, threading.BoundedSemaphore] = {}
+_host_limits_lock = threading.Lock()
+
+# While offline, GETs are answered from the HTTP cache. After a connection
+# error, the server is tried again after OFFLINE_RETRY seconds.
+OFFLINE_RETRY = 30
+offline: bool = args.offline
+_offline_since: float = 0.0
+
+# CacheSize is given in MiB; 0 disables the cache. A replay is answered from
+# its recording only, and must not end up in the cache of the user.
+http_cache: HTTPCache | None = None
+if config["CacheSize"] and not args.replay:
+    http_cache = HTTPCache(os.path.join(cache_home, "http"), int(config["CacheSize"] * 2**20))
+
+# Texts rendered from HTML: RenderCacheEntries in memory, RenderCacheSize MiB
+# on disk; 0 disables either
+render_cache: RenderCache | None = None
+if config["RenderCacheEntries"]:
+    render_cache = RenderCache(
+        config["RenderCacheEntries"],
+        os.path.join(cache_home, "render"),
+        int(config["RenderCacheSize"] * 2**20),
+    )
+
+# Batches of at least PRERENDER_THRESHOLD bodies are rendered by
+# RenderProcesses worker processes; a single process would gain nothing
+PRERENDER_THRESHOLD = 20
+render_pool: RenderPool | None = None
+if config["RenderProcesses"] > 1 and render_cache is not None:
+    render_pool = RenderPool(config["RenderProcesses"])
+
+# PrefetchSize is given in MiB; 0 disables prefetching
+prefetcher: Prefetcher | None = None
+if config["PrefetchSize"]:
+    prefetcher = Prefetcher(
+        lambda spec: make_request(**spec),
+        max_workers=config["PrefetchConcurrency"],
+        max_bytes=int(config["PrefetchSize"] * 2**20),
+        ttl=60,
+    )
+
+
+class _Flight:
+    """A GET request in progress that other callers can wait for."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.response: Response | None = None
+        self.error: BaseException | None = None
+
+
+_flights: dict[str, _Flight] = {}
+_flights_lock = threading.Lock()
+# requests: GETs actually sent, coalesced: GETs answered by another caller's request
+flight_stats: dict[str, int] = {"requests": 0, "coalesced": 0}
+
+if http_cache is not None:
+    metrics.add_source("HTTP cache", http_cache.stats)
+if render_cache is not None:
+    metrics.add_source("Render cache", render_cache.stats)
+if prefetcher is not None:
+    metrics.add_source("Prefetch", prefetcher.stats)
+metrics.add_source("Request coalescing", lambda: dict(flight_stats))
 
 
 def get_timestamp() -> str:
@@ -59,6 +181,7 @@ def make_request(
     headers: dict | None = None,
     no_token: bool = False,
     auth: bool = False,
+    stream: bool = False,
 ) -> Response:
     """Perform an HTTP request against the Confluence instance.
 
@@ -68,52 +191,489 @@ def make_request(
     :headers: additional request headers
     :no_token: skip attaching the XSRF token (some endpoints reject it)
     :auth: True when this request is the authentication call itself
+    :stream: leave the body of a successful GET unread; see stream_results
+
+    While offline, GETs are answered from the HTTP cache and anything else
+    raises NotCachedError. A connection error switches to offline mode.
     """
     if params is None:
         params = {}
     if headers is None:
         headers = {}
 
-    if not url.startswith(BASE_URL):
-        if url.startswith("/"):
-            url = f"{BASE_URL}{url}"
-        else:
-            url = f"{BASE_URL}/{url}"
+    url = _absolute_url(url)
+
+    if _is_offline():
+        return _offline_response(url, params, data, method)
+    try:
+        response = _send_request(url, params, data, method, headers, no_token, auth, stream)
+    except RequestConnectionError as e:
+        if http_cache is None:
+            raise
+        _go_offline(e)
+        return _offline_response(url, params, data, method)
+    if offline:
+        _go_online()
+    return response
+
+
+def _send_request(
+    url: str,
+    params: dict,
+    data: str | dict | None,
+    method: str,
+    headers: dict,
+    no_token: bool,
+    auth: bool,
+    stream: bool,
+) -> Response:
+    if data or method != "GET" or auth:
+        try:
+            return _make_request(url, params, data, method, headers, no_token, auth)
+        finally:
+            if method != "GET" and prefetcher is not None:
+                prefetcher.invalidate(url)
+
+    key = _request_key(url, params, headers)
+    prefetched = prefetcher.take(key) if prefetcher is not None else None
+    if prefetched is not None:
+        log.debug(f"Using prefetched response for {url}")
+        _record(prefetched, method, 0.0, "prefetch")
+        return prefetched
+
+    # Identical GETs that are already on their way share the same response
+    while True:
+        with _flights_lock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if flight is None:
+                # A body that is read while it arrives cannot be shared, so
+                # streamed requests only ever follow a flight
+                if not stream:
+                    flight = _flights[key] = _Flight()
+                flight_stats["requests"] += 1
+            else:
+                flight_stats["coalesced"] += 1
+                # Before the flight ends, so that a prefetch leading it does not keep the response
+                if prefetcher is not None:
+                    prefetcher.join(key)
+        if leader:
+            break
+        log.debug(f"Waiting for in-flight request to {url}")
+        waiting = time.perf_counter()
+        flight.done.wait()
+        if isinstance(flight.error, Cancelled):
+            # Whoever sent the request lost interest; we have not
+            check_cancelled()
+            continue
+        if flight.error is not None:
+            raise flight.error
+        assert flight.response is not None
+        _record(flight.response, method, time.perf_counter() - waiting, "coalesced")
+        return flight.response
+    if stream:
+        # Whatever a prefetch of the same request would bring is not needed anymore
+        if prefetcher is not None:
+            prefetcher.discard(key)
+        return _make_request(url, params, data, method, headers, no_token, auth, stream=True)
+    assert flight is not None
+    try:
+        flight.response = _make_request(url, params, data, method, headers, no_token, auth)
+        return flight.response
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def _is_offline() -> bool:
+    # After a connection error, the server is tried again from time to time
+    return offline and (args.offline or time.monotonic() - _offline_since < OFFLINE_RETRY)
+
+
+def _go_offline(reason: Exception) -> None:
+    global offline, _offline_since
+    _offline_since = time.monotonic()
+    if offline:
+        return
+    offline = True
+    log.error(f"Connection failed, working offline: {reason}")
+    app.alert("Connection failed, showing cached content", "warning")
+    app.set_offline(True)
+
+
+def _go_online() -> None:
+    global offline
+    offline = False
+    log.info("Connection restored")
+    app.alert("Back online", "info")
+    app.set_offline(False)
+
+
+def _offline_response(url: str, params: dict, data: str | dict | None, method: str) -> Response:
+    if data or method != "GET":
+        raise NotCachedError(f"Cannot send {method} requests while offline")
+    entry = http_cache.lookup(http_cache.key(url, params)) if http_cache is not None else None
+    response = http_cache.response(entry) if http_cache is not None and entry is not None else None
+    if response is None:
+        raise NotCachedError(f"Not available offline: {url}")
+    _record(response, method, 0.0, "offline")
+    return response
+
+
+def _absolute_url(url: str) -> str:
+    if url.startswith(BASE_URL):
+        return url
+    if url.startswith("/"):
+        return f"{BASE_URL}{url}"
+    return f"{BASE_URL}/{url}"
+
+
+def _request_key(url: str, params: dict | None, headers: dict | None) -> str:
+    extra = {f"header:{k}": v for k, v in (headers or {}).items()}
+    return HTTPCache.key(url, {**(params or {}), **extra})
+
+
+def invalidate(url: str) -> None:
+    """Forget prefetched responses from *url* or below it.
+
+    Requests changing content through another URL than its own use this,
+    e.g. comments posted through the tinymce or inline comment endpoints.
+    """
+    if prefetcher is not None:
+        prefetcher.invalidate(_absolute_url(url))
+
+
+def prefetch(specs: list[dict]) -> None:
+    """Fetch the GET requests in *specs* in the background.
+
+    A later make_request with the same arguments is answered from the
+    prefetched response, or joins the prefetch if it is still running.
+    Calling this again drops all prefetches that have not started yet.
+    """
+    if prefetcher is None:
+        return
+    requests = []
+    for spec in specs:
+        spec = {**spec, "url": _absolute_url(spec["url"])}
+        requests.append((_request_key(spec["url"], spec.get("params"), spec.get("headers")), spec))
+    prefetcher.submit(requests)
+
+
+def _make_request(
+    url: str,
+    params: dict,
+    data: str | dict | None,
+    method: str,
+    headers: dict,
+    no_token: bool,
+    auth: bool,
+    stream: bool = False,
+    revalidate: bool = True,
+) -> Response:
+    _ensure_session()
+    cache_key: str | None = None
+    cache_entry = None
+    if http_cache is not None and not data and method == "GET":
+        cache_key = http_cache.key(url, params)
+        if revalidate:
+            cache_entry = http_cache.lookup(cache_key)
 
     attempts = 0
     response: Response | None = None
+    start = time.perf_counter()
     while attempts < 2:
+        check_cancelled()
+        if not auth:
+            while not _session_ready.wait(0.1):
+                check_cancelled()
+        generation = _auth_generation
         log.info(f"Requesting {url}")
         app.alert(f"Requesting {url}...", "info")
         if not data and method == "GET":
-            response = session.get(url, params=params, headers=headers)
+            request_headers = headers
+            if cache_entry is not None:
+                request_headers = {**cache_entry.validators(), **headers}
+            response = session.get(url, params=params, headers=request_headers, stream=stream)
         else:
             if not no_token:
                 headers["X-Atlassian-Token"] = XSRF
             response = session.request(method, url, params=params, data=data, headers=headers)
         attempts += 1
+        _touch_session()
         response.encoding = "utf-8"
         if not_authenticated(response):
             log.error("Not logged in? Authenticating...")
             if auth:
                 raise PermissionError("Permission denied")
-            elif not authenticate_session():
+            elif not reauthenticate(generation):
                 return response
         else:
             break
 
     if response is None:
         raise RuntimeError("No response received from server")
+    # Nobody is waiting for the response anymore
+    check_cancelled()
+
+    # The body of a streamed response is cached and measured by stream_results
+    streaming = (
+        stream
+        and response.status_code == 200
+        and not args.dump_http
+        and recorder is None
+        and not not_authenticated(response)
+    )
+    if stream and not streaming:
+        response.content  # noqa: B018 -- read the body so the connection is released
+
+    cache_result = "-"
+    if http_cache is not None and cache_key is not None:
+        if cache_entry is not None and response.status_code == 304:
+            refreshed = http_cache.refresh(cache_entry, response)
+            if refreshed is None:
+                log.debug(f"Cached body of {url} is gone, requesting it again")
+                return _make_request(url, params, data, method, headers, no_token, auth, stream, revalidate=False)
+            response = refreshed
+            cache_result = "hit"
+        elif response.status_code == 200 and not not_authenticated(response):
+            http_cache.record_miss()
+            if not streaming:
+                http_cache.store(cache_key, response)
+            cache_result = "miss"
+    if not streaming:
+        _record(response, method, time.perf_counter() - start, cache_result, attempts - 1)
+    if recorder is not None:
+        recorder.record(response, time.perf_counter() - start)
 
     if not response.ok:
         app.alert(f"Received HTTP code {response.status_code}", "error")
         return response
-    if args.dump_http:
-        dump_http(response, args.dump_http)
+    if dump_writer is not None:
+        dump_http(response, dump_writer)
     app.reset_status()
     return response
 
 
+def stream_results(
+    url: str,
+    params: dict | None = None,
+    headers: dict | None = None,
+    key: str = "results",
+) -> tuple[Response, JSONArrayStream]:
+    """Request a list from the API and decode its items while they arrive.
+
+    Iterating over the returned stream yields the items of the array *key*;
+    the rest of the document is in its `envelope` afterwards. Only iterate
+    over it if the response is ok.
+
+    :params: dict of URL parameters
+    :headers: additional request headers
+    :key: name of the member holding the list
+    """
+    if params is None:
+        params = {}
+    url = _absolute_url(url)
+    start = time.perf_counter()
+    response = make_request(url, params=params, headers=headers, stream=True)
+    if response._content_consumed:  # type: ignore[attr-defined]
+        # Prefetched, shared with another request, revalidated or failed; the
+        # body is already in memory
+        return response, JSONArrayStream(response.iter_content(STREAM_CHUNK_SIZE), key)
+    return response, JSONArrayStream(_read_stream(response, url, params, start), key)
+
+
+def _read_stream(response: Response, url: str, params: dict, start: float) -> Iterator[bytes]:
+    writer = None
+    if http_cache is not None:
+        writer = http_cache.writer(http_cache.key(url, params), response)
+    size = 0
+    complete = False
+    try:
+        for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+            check_cancelled()
+            size += len(chunk)
+            if writer is not None:
+                writer.write(chunk)
+            yield chunk
+        complete = True
+    finally:
+        response.close()
+        if writer is not None:
+            if complete:
+                writer.commit()
+            else:
+                writer.abort()
+        elapsed = time.perf_counter() - start
+        metrics.record(
+            RequestRecord(
+                response.url,
+                "GET",
+                response.status_code,
+                elapsed,
+                min(response.elapsed.total_seconds(), elapsed),
+                size,
+                "miss" if http_cache is not None else "-",
+                0,
+                params.get("expand", ""),
+                profile_name(params.get("expand", "")),
+            )
+        )
+
+
+def _record(response: Response, method: str, elapsed: float, cache: str, retries: int = 0) -> None:
+    """Add *response* to the request metrics; *elapsed* is how long the caller waited."""
+    ttfb = 0.0
+    if cache not in ("prefetch", "coalesced"):
+        ttfb = min(response.elapsed.total_seconds(), elapsed)
+    expand = ""
+    if response.request is not None and response.request.url:
+        expand = parse_qs(urlsplit(response.request.url).query).get("expand", [""])[0]
+    metrics.record(
+        RequestRecord(
+            response.url,
+            method,
+            response.status_code,
+            elapsed,
+            ttfb,
+            len(response.content),
+            cache,
+            retries,
+            expand,
+            profile_name(expand),
+        )
+    )
+
+
+def _host_semaphore(url: str) -> threading.BoundedSemaphore:
+    host = urlsplit(url).netloc or urlsplit(BASE_URL).netloc
+    with _host_limits_lock:
+        if host not in _host_limits:
+            _host_limits[host] = threading.BoundedSemaphore(config["MaxConnectionsPerHost"])
+        return _host_limits[host]
+
+
+def _limited_request(spec: dict, token: CancelToken | None) -> Response:
+    set_current_token(token)
+    try:
+        with _host_semaphore(spec["url"]):
+            return make_request(**spec)
+    finally:
+        set_current_token(None)
+
+
+def fetch_many(specs: list[dict]) -> list[Response]:
+    """Perform several requests concurrently and return the responses in order.
+
+    Each item of *specs* is a dict of keyword arguments for make_request.
+    The number of parallel requests is limited by MaxConnections overall and
+    by MaxConnectionsPerHost for each host.
+    """
+    if len(specs) <= 1:
+        return [make_request(**spec) for spec in specs]
+    log.debug(f"Fetching {len(specs)} resources concurrently")
+    token = current_token()
+    futures = [_executor.submit(_limited_request, spec, token) for spec in specs]
+    try:
+        return [f.result() for f in futures]
+    finally:
+        for f in futures:
+            f.cancel()
+
+
+def reauthenticate(generation: int) -> bool:
+    """Refresh the session unless another thread did so since *generation*.
+
+    Requests started meanwhile wait until the new session is ready.
+    """
+    global _auth_generation, _auth_failed
+    with _auth_lock:
+        if generation != _auth_generation:
+            return True
+        if time.monotonic() - _auth_failed < AUTH_RETRY:
+            return False
+        _session_ready.clear()
+        try:
+            if not authenticate_session():
+                _auth_failed = time.monotonic()
+                return False
+            _auth_generation += 1
+            return True
+        finally:
+            _session_ready.set()
+
+
+def _touch_session() -> None:
+    global _last_request
+    _last_request = time.monotonic()
+
+
+def validate_session() -> None:
+    """Check whether the server still accepts the session and renew it if not.
+
+    This also opens a connection to the server, so the TLS handshake is
+    done by the time the user asks for something.
+    """
+    _ensure_session()
+    _touch_session()
+    if _is_offline():
+        return
+    generation = _auth_generation
+    try:
+        r = session.get(f"{BASE_URL}/rest/api/user/current", timeout=30)
+        # Instances with anonymous access answer as the anonymous user
+        anonymous = r.ok and "json" in r.headers.get("content-type", "") and r.json().get("type") == "anonymous"
+    except (RequestException, ValueError) as e:
+        log.debug(f"Session check failed: {e}")
+        return
+    if not_authenticated(r) or anonymous:
+        log.info("Session expired, renewing it in the background")
+        reauthenticate(generation)
+
+
+def keepalive(interval: float) -> None:
+    """Contact the server whenever it has not been for *interval* seconds.
+
+    This keeps the session from expiring while the UI is idle. If it has
+    expired anyway, it is renewed here rather than by the next request the
+    user is waiting for.
+    """
+    while True:
+        idle = time.monotonic() - _last_request
+        if idle < interval:
+            time.sleep(interval - idle)
+            continue
+        try:
+            validate_session()
+        except Exception as e:
+            # E.g. the password command or the login failed; try again later
+            log.exception(e)
+            time.sleep(interval)
+
+
+def start_session() -> None:
+    """Load and check the session, then keep it alive in the background.
+
+    Called once the UI is up; requests made before that load the saved
+    session themselves.
+    """
+    _ensure_session()
+    if args.offline or args.replay:
+        return
+    validate_session()
+    if config["KeepaliveInterval"]:
+        threading.Thread(target=keepalive, args=(config["KeepaliveInterval"],), name="keepalive", daemon=True).start()
+
+
+def preload_modules() -> None:
+    """Import the modules that are only needed for rendering content."""
+    for name in LAZY_MODULES:
+        import_module(name)
+
+
 def not_authenticated(response: Response) -> bool:
     if response.status_code in (401, 403):
         return True
@@ -142,6 +702,16 @@ def save_session() -> None:
         json.dump(cookies, f)
 
 
+def _ensure_session() -> None:
+    global _session_loaded
+    if _session_loaded:
+        return
+    with _session_lock:
+        if not _session_loaded:
+            load_session()
+            _session_loaded = True
+
+
 def load_session() -> None:
     """Load session cookies from cookie jar."""
     try:
@@ -177,6 +747,8 @@ def authenticate_session() -> bool:
     if reason != "OK":
         app.alert(f"Error while authenticating: {reason}", "error")
         return False
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(response.text, features="lxml")
     token_meta = soup.find("meta", {"id": "atlassian-token"})
     if token_meta is None:
@@ -188,33 +760,34 @@ def authenticate_session() -> bool:
     return True
 
 
-def dump_http(response: Response, filename: str) -> None:
-    with open(filename, "a") as f:
-        now = dt.now()
-        f.write(f"<<<<<< Request ({now})\n")
-        f.write(response.request.method or "")
-        f.write(" ")
-        f.write(response.request.url or "")
-        f.write("\n")
-        for k, v in response.request.headers.items():
-            f.write(f"{k}: {v}\n")
-        if response.request.body:
-            body = response.request.body
-            f.write("\n\n")
-            if isinstance(body, str):
-                f.write(body)
-            elif isinstance(body, bytes):
-                f.write(body.decode("utf-8", errors="replace"))
-            else:
-                f.write(str(body))
-        f.write("\n\n")
-        f.write(">>>>>> Response\n")
-        for k, v in response.headers.items():
-            f.write(f"{k}: {v}\n")
-        f.write("\n\n")
-        if response.text:
-            f.write(response.text)
+def dump_http(response: Response, writer: BackgroundWriter) -> None:
+    f = StringIO()
+    now = dt.now()
+    f.write(f"<<<<<< Request ({now})\n")
+    f.write(response.request.method or "")
+    f.write(" ")
+    f.write(response.request.url or "")
+    f.write("\n")
+    for k, v in response.request.headers.items():
+        f.write(f"{k}: {v}\n")
+    if response.request.body:
+        body = response.request.body
         f.write("\n\n")
+        if isinstance(body, str):
+            f.write(body)
+        elif isinstance(body, bytes):
+            f.write(body.decode("utf-8", errors="replace"))
+        else:
+            f.write(str(body))
+    f.write("\n\n")
+    f.write(">>>>>> Response\n")
+    for k, v in response.headers.items():
+        f.write(f"{k}: {v}\n")
+    f.write("\n\n")
+    if response.text:
+        f.write(response.text)
+    f.write("\n\n")
+    writer.write(f.getvalue())
 
 
 def html_to_text(
@@ -222,78 +795,92 @@ def html_to_text(
     replace_emoticons: bool = False,
     fix_creation_links: bool = False,
 ) -> str:
-    if replace_emoticons:
-        html = convert_emoticons(html)
-    if fix_creation_links:
-        html = remove_creation_links(html)
+    """Render *html* as text, or take the text from the render cache."""
+    key = None
+    if render_cache is not None:
+        key = render_key(html, replace_emoticons, fix_creation_links)
+        text = render_cache.get(key)
+        if text is not None:
+            return text
+    from congruence import htmltext
+
     try:
-        return html2text.html2text(html).strip()
+        text = htmltext.html_to_text(html, replace_emoticons, fix_creation_links)
     except Exception as e:
         log.exception(e)
         return html
+    if key is not None:
+        render_cache.put(key, text)  # type: ignore[union-attr]
+    return text
+
 
+def prerender(bodies: list[str], replace_emoticons: bool = False, fix_creation_links: bool = False) -> None:
+    """Put the texts of many bodies into the render cache at once.
 
-def remove_creation_links(html: str) -> str:
-    soup = BeautifulSoup(html, features="lxml")
-    links = soup.findAll("a", "createlink")  # type: ignore[arg-type]
-    for link in links:
-        link["href"] = re.sub("[0-9]+$", "", link["href"])
-    return str(soup)
-
-
-def convert_emoticons(html: str) -> str:
-    """Replace Confluence emoticon images with regular smileys."""
-    emoticon_dict: dict[str, str] = {
-        "smile": ":)",
-        "sad": ":(",
-        "cheeky": ":P",
-        "laugh": ":D",
-        "wink": ";)",
-        "thumbs-up": "👍",
-        "thumbs-down": "👎",
-        "light-on": "💡",
-        "warning": "❗",
-        "yellow-star": "⭐",
-        "tick": "✔️",
-        "cross": "❌",
-        "information": "ℹ️",  # noqa: RUF001
-        "plus": "➕",  # noqa: RUF001
-        "minus": "➖",  # noqa: RUF001
-        "question": "❓",
-        "heart": "❤️️",
-        "broken-heart": "💔",
-    }
-    soup = BeautifulSoup(html, features="lxml")
-    emoticons = soup.findAll("img", "emoticon")  # type: ignore[arg-type]
-    for emoticon in emoticons:
-        for k, v in emoticon_dict.items():
-            if f"emoticon-{k}" in emoticon["class"]:
-                emoticon.replace_with(v)
-    return str(soup)
+    This spreads the work over the render processes, so that html_to_text
+    finds the texts in the cache afterwards. Small batches are left to
+    html_to_text.
+    """
+    if render_pool is None or render_cache is None:
+        return
+    keys = {}
+    for html in bodies:
+        key = render_key(html, replace_emoticons, fix_creation_links)
+        if html and key not in keys and render_cache.get(key) is None:
+            keys[key] = html
+    if len(keys) < PRERENDER_THRESHOLD:
+        return
+    start = time.perf_counter()
+    by_html = {html: key for key, html in keys.items()}
+    for html, text in render_pool.render(list(keys.values()), replace_emoticons, fix_creation_links):
+        if text is not None:
+            render_cache.put(by_html[html], text)
+    log.debug(f"Rendered {len(keys)} bodies in {time.perf_counter() - start:.2f}s")
 
 
 def md_to_html(text: str, url_encode: str | None = None) -> str:
+    import markdown
+
     result = markdown.markdown(text)
     if url_encode:
         result = urlencode({url_encode: result})
     return result
 
 
+# What the API returns, e.g. 2020-05-04T12:00:00.000+02:00
+_iso_date = re.compile(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d+)?(Z|[+-]\d\d:?\d\d)$")
+# Milliseconds since the epoch, as in notifications
+_epoch_ms = re.compile(r"\d{11,}$")
+
+
+@lru_cache(maxsize=4096)
+def parse_date(date: str | int) -> dt:
+    """Parse any date the API returns into a timezone-aware datetime.
+
+    Timestamps and dates without a timezone are taken to be in local time.
+    """
+    if isinstance(date, int) or _epoch_ms.match(date):
+        return dt.fromtimestamp(int(date) / 1000.0).astimezone()
+    if _iso_date.match(date):
+        return dt.fromisoformat(date)
+    from dateutil.parser import parse as dtparse
+
+    parsed = dtparse(date)
+    if parsed.tzinfo is None:
+        parsed = parsed.astimezone()
+    return parsed
+
+
 def convert_date(date: str | int, frmt: str = "default") -> str:
-    """Convert the multitude of date formats to a common one."""
-    try:
-        parsed = dtparse(str(date))
-        now = dt.utcnow().replace(tzinfo=pytz.utc)
-    except (ValueError, TypeError, OverflowError):
-        if isinstance(date, int):
-            parsed = dt.fromtimestamp(date / 1000.0)
-            now = dt.now()
-        else:
-            parsed = dt.strptime(date, "%Y-%m-%dT%H:%M:%S%z")
-            now = dt.utcnow().replace(tzinfo=pytz.utc)
-    diff = now - parsed
-    if frmt == "default":
+    """Convert the multitude of date formats to a common one.
+
+    :frmt: "default" (DateFormat), "friendly" (the shorter, the more
+        recent) or "timespan" (how long ago)
+    """
+    parsed = parse_date(date)
+    if frmt not in ("friendly", "timespan"):
         return parsed.strftime(config["DateFormat"])
+    diff = dt.now(UTC) - parsed
     if frmt == "friendly":
         if diff < timedelta(hours=24):
             return parsed.strftime("%H:%M")
@@ -303,17 +890,12 @@ def convert_date(date: str | int, frmt: str = "default") -> str:
             return parsed.strftime("%b %d")
         else:
             return parsed.strftime("%x")
-    if frmt == "timespan":
-        total_seconds = int(diff.total_seconds())
-        if diff < timedelta(minutes=60):
-            return f"{total_seconds // 60} min ago"
-        elif diff < timedelta(hours=24):
-            return f"{total_seconds // 3600} hours ago"
-        elif diff < timedelta(days=31):
-            return f"{diff.days} days ago"
-        else:
-            return f"{diff.days // 365} years ago"
-    return parsed.strftime(config["DateFormat"])
-
-
-load_session()
+    total_seconds = int(diff.total_seconds())
+    if diff < timedelta(minutes=60):
+        return f"{total_seconds // 60} min ago"
+    elif diff < timedelta(hours=24):
+        return f"{total_seconds // 3600} hours ago"
+    elif diff < timedelta(days=31):
+        return f"{diff.days} days ago"
+    else:
+        return f"{diff.days // 365} years ago"
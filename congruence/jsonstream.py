@@ -0,0 +1,158 @@
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Incremental parsing of JSON documents of the form {..., "results": [...]}.
+
+The Confluence API wraps lists of objects in an envelope with paging
+information. For large responses, the items of the list are decoded one at a
+time as the body arrives instead of parsing the whole document at once.
+"""
+
+from __future__ import annotations
+
+import codecs
+import json
+import time
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+_decoder = json.JSONDecoder()
+WHITESPACE = " \t\n\r"
+
+
+class JSONArrayStream:
+    """Iterate over the items of the array *key* in a JSON object.
+
+    All other members of the object are collected in `envelope`, which is
+    complete once the iteration has finished.
+
+    :chunks: the document as an iterable of byte strings
+    :key: name of the top-level member holding the array
+    """
+
+    def __init__(self, chunks: Iterable[bytes], key: str = "results") -> None:
+        self.key = key
+        self.envelope: dict[str, Any] = {}
+        self.count = 0
+        self._chunks = iter(chunks)
+        self._decode = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, minimum: int = 1) -> bool:
+        """Append at least *minimum* characters to the buffer, unless the
+        document ends first; False if there was nothing left to append."""
+        if self._eof:
+            return False
+        parts = []
+        size = 0
+        for chunk in self._chunks:
+            text = self._decode.decode(chunk)
+            parts.append(text)
+            size += len(text)
+            if size >= minimum:
+                break
+        else:
+            parts.append(self._decode.decode(b"", final=True))
+            size += len(parts[-1])
+            self._eof = True
+        # Drop what has been consumed so the buffer stays small; the buffer is
+        # copied once per call, not once per chunk
+        self._buffer = self._buffer[self._pos :] + "".join(parts)
+        self._pos = 0
+        return size > 0
+
+    def _skip_whitespace(self) -> str:
+        """Return the next significant character without consuming it."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise json.JSONDecodeError("Unexpected end of document", self._buffer, self._pos)
+
+    def _expect(self, chars: str) -> str:
+        c = self._skip_whitespace()
+        if c not in chars:
+            raise json.JSONDecodeError(f"Expected one of {chars!r}", self._buffer, self._pos)
+        self._pos += 1
+        return c
+
+    def _value(self) -> Any:
+        """Decode the next complete value, reading more data as necessary."""
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # Only try again once there is twice as much to decode, so
+                # that a large value is not decoded over and over as it arrives
+                if self._fill(len(self._buffer) - self._pos):
+                    continue
+                raise
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self._buffer) and isinstance(value, int | float) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def __iter__(self) -> Iterator[Any]:
+        self._expect("{")
+        if self._skip_whitespace() == "}":
+            self._pos += 1
+            self._finish()
+            return
+        while True:
+            name = self._value()
+            self._expect(":")
+            if name == self.key and self._skip_whitespace() == "[":
+                self._pos += 1
+                if self._skip_whitespace() == "]":
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value()
+                        self.count += 1
+                        if self._expect(",]") == "]":
+                            break
+            else:
+                self.envelope[name] = self._value()
+            if self._expect(",}") == "}":
+                self._finish()
+                return
+
+    def _finish(self) -> None:
+        """Read the rest of the document, which must be empty."""
+        while self._fill():
+            pass
+        if self._buffer[self._pos :].strip(WHITESPACE):
+            raise json.JSONDecodeError("Extra data", self._buffer, self._pos)
+
+
+def batched(items: Iterable[Any], interval: float = 0.2) -> Iterator[list[Any]]:
+    """Group *items* into lists, one per *interval* seconds of arrival time."""
+    batch: list[Any] = []
+    last = time.monotonic()
+    for item in items:
+        batch.append(item)
+        if time.monotonic() - last >= interval:
+            yield batch
+            batch = []
+            last = time.monotonic()
+    if batch:
+        yield batch
@@ -49,6 +49,8 @@ KEYS = {
     'cli browser': ('b', "Open with CLI browser"),
     'gui browser': ('B', "Open with GUI browser"),
     'show log': ('!', "Show application log"),
+    'show metrics': ('%', "Show request metrics"),
+    'export metrics': ('E', "Export request metrics as JSON"),
     'post comment': ('P', "Post a new comment to a page"),
     'go to comments': ('C', "Go to the comment section of a page"),
     'search confluence': ('s', "Perform a server-side Confluence search"),
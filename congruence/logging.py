@@ -14,10 +14,13 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import logging
-from io import StringIO
+from collections import deque
+from typing import Any
 
-from congruence.args import LOG_FILE, args
+from congruence.args import LOG_FILE, args, config
+from congruence.writer import BackgroundWriter, WriterHandler
 
 logging.getLogger().setLevel(logging.DEBUG)
 
@@ -28,19 +31,76 @@ FORMAT = (
 
 logFormatter = logging.Formatter(FORMAT)
 
-log_stream = StringIO()
-stream_handler = logging.StreamHandler(log_stream)
-stream_handler.setFormatter(logFormatter)
-stream_handler.setLevel(logging.DEBUG)
 
-file_handler = logging.FileHandler(LOG_FILE)
-file_handler.setFormatter(logFormatter)
-file_handler.setLevel(logging.DEBUG)
+class LogBuffer(logging.Handler):
+    """Keep the most recent records for the log view.
+
+    Records are only formatted when the log is shown, which is rarely.
+
+    :capacity: number of records kept
+    """
+
+    def __init__(self, capacity: int) -> None:
+        super().__init__()
+        self.records: deque[logging.LogRecord] = deque(maxlen=capacity)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.exc_info:
+            # Do not keep the frames of the traceback alive
+            record.exc_text = (self.formatter or logFormatter).formatException(record.exc_info)
+            record.exc_info = None
+        self.records.append(record)
+
+    def getvalue(self) -> str:
+        """Return the records kept as text."""
+        lines = []
+        for record in list(self.records):
+            try:
+                lines.append(self.format(record) + "\n")
+            except Exception:
+                lines.append(f"Unformattable log record: {record.msg!r}\n")
+        return "".join(lines)
+
+
+class LazyJSON:
+    """Log argument that is only serialized if the record is formatted.
+
+    Use it as `log.debug("%s", LazyJSON(data))`.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: Any) -> None:
+        self.data = data
+
+    def __str__(self) -> str:
+        return json.dumps(self.data, indent=2)
+
+
+log_buffer = LogBuffer(config["LogLines"])
+log_buffer.setFormatter(logFormatter)
+log_buffer.setLevel(logging.DEBUG)
 
 log = logging.getLogger(__name__)
 
-log.addHandler(stream_handler)
+log.addHandler(log_buffer)
+
+# The raw data of API objects goes to the same handlers, but only with
+# --log-payloads, since there is a lot of it
+payload_log = logging.getLogger(f"{__name__}.payload")
+payload_log.setLevel(logging.DEBUG if args.log_payloads else logging.INFO)
 if args.log:
+    # Written in the background, so logging does not slow down the UI
+    file_handler = WriterHandler(
+        BackgroundWriter(
+            f"{LOG_FILE}.gz" if config["CompressLog"] else LOG_FILE,
+            compress=config["CompressLog"],
+            max_size=int(config["MaxLogSize"] * 2**20),
+            backups=config["RotatedFiles"],
+        )
+    )
+    file_handler.setFormatter(logFormatter)
+    file_handler.setLevel(logging.DEBUG)
     log.addHandler(file_handler)
 
 # Disable annoying debug messages about charsets (probably from requests)
@@ -0,0 +1,202 @@
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Timing and size measurements of the requests made to Confluence."""
+
+from __future__ import annotations
+
+import json
+import math
+import re
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from urllib.parse import urlsplit
+
+# Path segments that identify a single object, replaced by a placeholder
+ID_PATTERN = re.compile(r"^\d+$")
+KEYED_SEGMENTS = {"space": "{key}", "user": "{username}"}
+
+
+def endpoint_template(url: str) -> str:
+    """Reduce a URL to the endpoint it addresses, e.g. rest/api/content/{id}."""
+    segments = [s for s in urlsplit(url).path.split("/") if s]
+    result = []
+    for i, segment in enumerate(segments):
+        if ID_PATTERN.match(segment):
+            result.append("{id}")
+        elif i > 0 and segments[i - 1] in KEYED_SEGMENTS and segments[i - 2 : i - 1] == ["api"]:
+            result.append(KEYED_SEGMENTS[segments[i - 1]])
+        else:
+            result.append(segment)
+    return "/".join(result)
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile of the sorted list *values*."""
+    if not values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(values)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class RequestRecord:
+    """Measurements of one request.
+
+    Times are in seconds. requests does not expose DNS and connect times
+    separately, so they are part of *ttfb* (time until the response headers
+    were parsed). *download* is the time spent reading the body.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        method: str,
+        status: int,
+        elapsed: float,
+        ttfb: float,
+        size: int,
+        cache: str,
+        retries: int,
+        expand: str = "",
+        profile: str = "-",
+    ) -> None:
+        self.timestamp = time.time()
+        self.url = url
+        self.endpoint = endpoint_template(url)
+        self.method = method
+        self.status = status
+        self.elapsed = elapsed
+        self.ttfb = ttfb
+        self.download = max(elapsed - ttfb, 0.0)
+        self.size = size
+        self.cache = cache
+        self.retries = retries
+        self.expand = expand
+        self.profile = profile
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class RequestMetrics:
+    """Collects the most recent request records and aggregates them.
+
+    :capacity: number of records that are kept
+    """
+
+    def __init__(self, capacity: int = 10000) -> None:
+        self._records: deque[RequestRecord] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._sources: dict[str, Callable[[], dict]] = {}
+
+    def record(self, record: RequestRecord) -> None:
+        with self._lock:
+            self._records.append(record)
+
+    def add_source(self, name: str, stats: Callable[[], dict]) -> None:
+        """Register a callable whose counters are shown next to the requests."""
+        self._sources[name] = stats
+
+    def records(self) -> list[RequestRecord]:
+        with self._lock:
+            return list(self._records)
+
+    def summary(self) -> dict[str, dict]:
+        """Aggregate all records by endpoint and method."""
+        groups: dict[str, list[RequestRecord]] = {}
+        for r in self.records():
+            groups.setdefault(f"{r.method} {r.endpoint}", []).append(r)
+        result = {}
+        for name, records in groups.items():
+            latencies = sorted(r.elapsed for r in records)
+            ttfbs = sorted(r.ttfb for r in records)
+            cache: dict[str, int] = {}
+            for r in records:
+                cache[r.cache] = cache.get(r.cache, 0) + 1
+            result[name] = {
+                "count": len(records),
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "ttfb_p50": percentile(ttfbs, 50),
+                "total_time": sum(latencies),
+                "bytes": sum(r.size for r in records),
+                "errors": sum(1 for r in records if r.status >= 400),
+                "retries": sum(r.retries for r in records),
+                "cache": cache,
+            }
+        return result
+
+    def by_profile(self) -> dict[str, dict]:
+        """Count the transferred bytes per expand profile."""
+        result: dict[str, dict] = {}
+        for r in self.records():
+            if r.cache in ("prefetch", "coalesced"):
+                # Already counted when the actual request was made
+                continue
+            s = result.setdefault(r.profile, {"count": 0, "bytes": 0})
+            s["count"] += 1
+            s["bytes"] += r.size
+        for s in result.values():
+            s["mean"] = s["bytes"] / s["count"]
+        return result
+
+    def sources(self) -> dict[str, dict]:
+        return {name: stats() for name, stats in self._sources.items()}
+
+    def report(self) -> str:
+        """Return a plain-text table of the summary."""
+        summary = sorted(self.summary().items(), key=lambda item: -item[1]["total_time"])
+        lines = [
+            f"{'Endpoint':<50} {'n':>5} {'p50':>7} {'p95':>7} {'p99':>7} {'KiB':>8} {'err':>4}  cache",
+            "",
+        ]
+        for name, s in summary:
+            cache = ", ".join(f"{k}: {v}" for k, v in sorted(s["cache"].items()))
+            lines.append(
+                f"{name[:50]:<50} {s['count']:>5} "
+                f"{s['p50'] * 1000:>7.0f} {s['p95'] * 1000:>7.0f} {s['p99'] * 1000:>7.0f} "
+                f"{s['bytes'] / 1024:>8.1f} {s['errors']:>4}  {cache}"
+            )
+        lines.append("")
+        lines.append("Latencies in milliseconds.")
+        lines.append("")
+        lines.append(f"{'Expand profile':<50} {'n':>5} {'KiB':>8} {'KiB/req':>8}")
+        lines.append("")
+        for name, s in sorted(self.by_profile().items(), key=lambda item: -item[1]["bytes"]):
+            lines.append(f"{name[:50]:<50} {s['count']:>5} {s['bytes'] / 1024:>8.1f} {s['mean'] / 1024:>8.1f}")
+        for name, stats in self.sources().items():
+            lines.append("")
+            lines.append(f"{name}:")
+            lines += [f"    {k}: {v}" for k, v in stats.items()]
+        return "\n".join(lines)
+
+    def export(self, filename: str) -> None:
+        """Write all records, the summary and the counters as JSON."""
+        data = {
+            "exported": time.time(),
+            "summary": self.summary(),
+            "profiles": self.by_profile(),
+            "counters": self.sources(),
+            "records": [r.to_dict() for r in self.records()],
+        }
+        with open(filename, "w") as f:
+            json.dump(data, f, indent=2)
+
+
+metrics = RequestMetrics()
@@ -14,32 +14,73 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
-"""Classes representing content objects in Confluence."""
+"""Classes representing content objects in Confluence.
+
+The classes use __slots__, since a long comment thread creates thousands of
+them. Objects are made with resolve(), so that all views share them: users
+and spaces are interned, so all content by the same user refers to one User
+object and one copy of its data. Content is kept in an identity map by ID and
+version, and state such as likes is shared by all versions of it.
+
+Most objects are only ever shown as a row of columns, so their other fields
+are read from the raw data when they are first used: a slot that has not
+been set yet is filled by the method _load_<name>.
+"""
 
 from __future__ import annotations
 
 import json
 import re
+import sys
+import threading
 from abc import ABC, abstractmethod
-from typing import ClassVar
+from typing import TYPE_CHECKING, Any, ClassVar, Self
 from uuid import uuid4
+from weakref import WeakValueDictionary
 
 from congruence.args import config
-from congruence.interface import convert_date, html_to_text, make_request, md_to_html
-from congruence.logging import log
+from congruence.interface import convert_date, html_to_text, invalidate, make_request, md_to_html
+from congruence.logging import LazyJSON, log, payload_log
+from congruence.profiles import content_request
+
+
+def _version_of(data: dict) -> dict:
+    """Return the version information in the content data *data*."""
+    return data.get("version") or data.get("history", {}).get("lastUpdated", {})
 
 
 def is_blacklisted_user(username: str) -> bool:
     return "UserBlacklist" in config and username in config["UserBlacklist"]
 
 
+def fetch_body(obj_id: str) -> dict:
+    """Request the rendered body of the content object *obj_id*."""
+    r = make_request(**content_request(obj_id, "body"))
+    r.raise_for_status()
+    return r.json()["body"]
+
+
 class ConfluenceObject(ABC):
     """Base class for all Confluence content objects (pages, comments, users, spaces, ...)."""
 
+    __slots__ = ("__weakref__", "_data", "object_id", "type")
+
     def __init__(self, data: dict) -> None:
         self._data = data
         self.object_id: str = data.get("id", "")
-        log.debug(json.dumps(data, indent=2))
+        payload_log.debug("%s", LazyJSON(data))
+
+    if not TYPE_CHECKING:
+        # Hidden from type checkers, which would otherwise accept any attribute
+
+        def __getattr__(self, name: str) -> Any:
+            # Only called for slots that have not been set yet
+            load = getattr(type(self), f"_load_{name}", None)
+            if load is None:
+                raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+            value = load(self)
+            setattr(self, name, value)
+            return value
 
     @abstractmethod
     def get_title(self) -> str:
@@ -53,6 +94,33 @@ class ConfluenceObject(ABC):
     def id(self) -> str:
         return self.object_id
 
+    @classmethod
+    def resolve(cls, data: dict) -> Self:
+        """Return an object for *data*; subclasses return one shared by all views."""
+        return cls(data)
+
+    @classmethod
+    def _shared(cls, registry: WeakValueDictionary[str, Self], key: str, data: dict) -> Self:
+        """Return the object registered for *key*, or register a new one made from *data*.
+
+        An object made from different data is not shared.
+        """
+        obj = registry.get(key)
+        if obj is None or obj._data != data:
+            obj = cls(data)
+            registry[key] = obj
+        return obj
+
+    def _unload(self) -> None:
+        """Forget the fields loaded from the raw data, so they are loaded again."""
+        for klass in type(self).__mro__:
+            for name in klass.__dict__.get("__slots__", ()):
+                if hasattr(klass, f"_load_{name}"):
+                    try:
+                        delattr(self, name)
+                    except AttributeError:
+                        pass
+
     def get_json(self) -> str:
         return json.dumps(self._data, indent=2, sort_keys=True)
 
@@ -68,47 +136,185 @@ class ConfluenceObject(ABC):
         return bool(re.search(search_string, self.get_title()) or re.search(search_string, self.get_content()))
 
 
+class ContentState:
+    """What all objects for the same content have in common, whatever their version."""
+
+    __slots__ = ("__weakref__", "latest_version", "liked")
+
+    def __init__(self) -> None:
+        self.liked = False
+        self.latest_version = 0
+
+
 class Content(ConfluenceObject):
     """Base class for Pages, Blogposts, Comments, and Attachments."""
 
+    __slots__ = (
+        "_state",
+        "blacklisted",
+        "created_by",
+        "created_date",
+        "last_updated_when",
+        "space",
+        "title",
+        "version_message",
+        "version_number",
+        "versionby",
+        "webui_url",
+    )
+
+    # Loaded when first used
+    versionby: User
+    last_updated_when: str
+    created_date: str
+    created_by: User | None
+    version_number: int
+    version_message: str
+    webui_url: str
+    space: Space | None
+    blacklisted: bool
+
+    # (ID, version) -> Content, for as long as any view refers to it
+    _objects: ClassVar[WeakValueDictionary[tuple[str, int], Content]] = WeakValueDictionary()
+    # ID -> state shared by all versions
+    _states: ClassVar[WeakValueDictionary[str, ContentState]] = WeakValueDictionary()
+    _lock: ClassVar[threading.Lock] = threading.Lock()
+
     def __init__(self, data: dict) -> None:
         super().__init__(data)
         self.title: str = data["title"]
-        self.type: str = data.get("type", "?")
+        self.type: str = sys.intern(data.get("type", "?"))
+        with Content._lock:
+            state = Content._states.get(self.object_id) if self.object_id else None
+            if state is None:
+                state = ContentState()
+                if self.object_id:
+                    Content._states[self.object_id] = state
+        self._state: ContentState = state
+        state.latest_version = max(state.latest_version, self.version_number)
+
+    @classmethod
+    def resolve(cls, data: dict) -> Self:
+        """Return the object for the content in *data*, shared by all views.
+
+        If there already is an object for this version, *data* is merged into
+        it; it may have been requested with other fields expanded.
+        """
+        object_id = data.get("id")
+        if not object_id:
+            return cls(data)
+        key = (object_id, _version_of(data).get("number", 0))
+        with Content._lock:
+            obj = Content._objects.get(key)
+        # An object of another class, e.g. a Page that is asked for as a Blogpost, is not shared
+        if type(obj) is cls:
+            obj._merge(data)
+            return obj
+        obj = cls(data)
+        with Content._lock:
+            Content._objects[key] = obj
+        return obj
+
+    def _merge(self, data: dict) -> None:
+        if data is self._data:
+            return
+        # Other threads may be reading the raw data, so it is replaced rather than changed
+        with Content._lock:
+            merged = dict(self._data)
+            for key, value in data.items():
+                old = merged.get(key)
+                if isinstance(old, dict) and isinstance(value, dict):
+                    merged[key] = {**old, **value}
+                else:
+                    merged[key] = value
+            self._data = merged
+        self._unload()
+
+    @property
+    def liked(self) -> bool:
+        return self._state.liked
 
-        history = data.get("history", {})
-        last_updated = history.get("lastUpdated", {})
-        self.versionby: User = User(last_updated["by"])
-        self.last_updated_when: str = last_updated.get("when", "")
-        self.created_date: str = history.get("createdDate", "")
+    @liked.setter
+    def liked(self, liked: bool) -> None:
+        self._state.liked = liked
+
+    @property
+    def latest_version(self) -> int:
+        """The newest version of this content any view has seen."""
+        return self._state.latest_version
+
+    def _last_updated(self) -> dict:
+        return self._data.get("history", {}).get("lastUpdated", {})
+
+    def _load_versionby(self) -> User:
+        last_updated = self._last_updated()
+        user = User.resolve(last_updated["by"])
+        # Keep only one copy of the user's data
+        last_updated["by"] = user._data
+        version = _version_of(self._data)
+        if version.get("by") == user._data:
+            version["by"] = user._data
+        return user
+
+    def _load_last_updated_when(self) -> str:
+        return self._last_updated().get("when", "")
+
+    def _load_created_date(self) -> str:
+        return self._data.get("history", {}).get("createdDate", "")
+
+    def _load_created_by(self) -> User | None:
+        history = self._data.get("history", {})
         created_by = history.get("createdBy")
-        self.created_by: User | None = User(created_by) if created_by else None
+        if not created_by:
+            return None
+        user = User.resolve(created_by)
+        history["createdBy"] = user._data
+        return user
+
+    def _load_version_number(self) -> int:
+        return _version_of(self._data).get("number", 0)
 
-        version = data.get("version") or last_updated
-        self.version_number: int = version.get("number", 0)
-        self.version_message: str = version.get("message", "")
+    def _load_version_message(self) -> str:
+        return _version_of(self._data).get("message", "")
 
-        links = data.get("_links", {})
-        self.webui_url: str = links.get("webui", "")
+    def _load_webui_url(self) -> str:
+        return self._data.get("_links", {}).get("webui", "")
 
-        space_data = data.get("space")
-        self.space: Space | None = Space(space_data) if space_data else None
+    def _load_space(self) -> Space | None:
+        space_data = self._data.get("space")
+        if not space_data:
+            return None
+        space = Space.resolve(space_data)
+        self._data["space"] = space._data
+        return space
 
-        self.blacklisted: bool = is_blacklisted_user(self.versionby.username)
-        self.liked: bool = False
+    def _load_blacklisted(self) -> bool:
+        # Without creating the User, since this is checked for every search result
+        return is_blacklisted_user(self._last_updated()["by"]["username"])
 
     def get_title(self) -> str:
         return self.title
 
     def get_columns(self) -> list[str]:
+        # From the raw data, so that rows in a list do not load any fields
+        last_updated = self._last_updated()
+        space_data = self._data.get("space")
         return [
             self.type[0].upper(),
-            self.space.key if self.space else "?",
-            self.versionby.display_name,
-            convert_date(self.last_updated_when, "friendly"),
+            space_data["key"] if space_data else "?",
+            last_updated["by"]["displayName"],
+            convert_date(last_updated.get("when", ""), "friendly"),
             self.get_title(),
         ]
 
+    def get_body(self) -> str:
+        """Return the rendered body, requesting it if it was not expanded."""
+        if "view" not in self._data.get("body", {}):
+            body = fetch_body(self.object_id)
+            with Content._lock:
+                self._data = {**self._data, "body": {**self._data.get("body", {}), **body}}
+        return self._data["body"]["view"]["value"]
+
     def like(self) -> bool:
         log.debug(f"Liking {self.object_id}")
         headers = {"Content-Type": "application/json"}
@@ -154,54 +360,63 @@ class Content(ConfluenceObject):
 
 
 class Page(Content):
-    pass
+    __slots__ = ()
 
 
 class Blogpost(Page):
-    pass
+    __slots__ = ()
 
 
 class Comment(Content):
+    __slots__ = ("ancestor_root_link", "body_html", "container_path", "head", "is_inline", "ref", "url")
+
+    # Loaded when first used
+    url: str
+    body_html: str
+    container_path: str
+    ancestor_root_link: str | None
+    head: str
+    ref: str | None
+    is_inline: bool
+
     def __init__(self, data: dict) -> None:
         super().__init__(data)
         self.type = "comment"
+        # Threads can be long, so share the data of the authors and the space right away
+        self.versionby = self._load_versionby()
+        self.created_by = self._load_created_by()
+        self.space = self._load_space()
+
+    def _load_url(self) -> str:
+        return self._data.get("_links", {}).get("webui", "")
+
+    def _load_body_html(self) -> str:
+        return self._data.get("body", {}).get("view", {}).get("value", "")
 
-        self.url: str = data.get("_links", {}).get("webui", "")
-        self.body_html: str = data.get("body", {}).get("view", {}).get("value", "")
-        self.container_path: str = data.get("_expandable", {}).get("container", "")
+    def _load_container_path(self) -> str:
+        return self._data.get("_expandable", {}).get("container", "")
 
-        ancestors = data.get("ancestors", [])
+    def _load_ancestor_root_link(self) -> str | None:
         try:
-            self.ancestor_root_link: str | None = ancestors[0]["_links"]["self"]
+            return self._data.get("ancestors", [])[0]["_links"]["self"]
         except (IndexError, KeyError):
-            self.ancestor_root_link = None
+            return None
 
-        username = self.versionby.display_name
-        if self.blacklisted:
-            username = "<blocked user>"
-        self.head: str = f"{username}, {convert_date(self.created_date)}"
-
-        self.ref: str | None = None
-        self.is_inline: bool = False
-        extensions = data.get("extensions", {})
-        inline_properties = extensions.get("inlineProperties")
-        if inline_properties is not None:
-            self.ref = inline_properties.get("originalSelection")
-            if self.ref:
-                self.head += " (inline comment)"
-                self.is_inline = True
+    def _load_ref(self) -> str | None:
+        inline_properties = self._data.get("extensions", {}).get("inlineProperties")
+        if inline_properties is None:
+            return None
+        return inline_properties.get("originalSelection")
 
-    def get_title(self) -> str:
-        return self.title
+    def _load_is_inline(self) -> bool:
+        return bool(self.ref)
 
-    def get_columns(self) -> list[str]:
-        return [
-            self.type[0].upper(),
-            self.space.key if self.space else "?",
-            self.versionby.display_name,
-            convert_date(self.last_updated_when, "friendly"),
-            self.get_title(),
-        ]
+    def _load_head(self) -> str:
+        username = "<blocked user>" if self.blacklisted else self.versionby.display_name
+        head = f"{username}, {convert_date(self.created_date)}"
+        if self.is_inline:
+            head += " (inline comment)"
+        return head
 
     def get_head(self) -> str:
         return self.head
@@ -232,6 +447,7 @@ class Comment(Content):
         headers = {"X-Atlassian-Token": "no-check"}
         data = f"{answer}&watch=false&uuid={uuid}"
         r = make_request(url, params, method="POST", data=data, headers=headers, no_token=True)
+        invalidate(f"rest/api/content/{page_id}")
         return r.status_code == 200
 
     def send_inline_reply(self, text: str) -> bool:
@@ -255,6 +471,7 @@ class Comment(Content):
             "X-Requested-With": "XMLHttpRequest",
         }
         r = make_request(url, params, method="POST", data=json.dumps(data), headers=headers)
+        invalidate(f"rest/api/content/{page_id}")
         if r.status_code == 200:
             return True
         log.debug(r.request.headers)
@@ -264,15 +481,25 @@ class Comment(Content):
 
 
 class Attachment(Content):
-    pass
+    __slots__ = ()
 
 
 class User(ConfluenceObject):
+    __slots__ = ("display_name", "username")
+
+    # username -> User, for as long as anything refers to it
+    _registry: ClassVar[WeakValueDictionary[str, User]] = WeakValueDictionary()
+
     def __init__(self, data: dict) -> None:
         super().__init__(data)
         self.type: str = "user"
-        self.display_name: str = data["displayName"]
-        self.username: str = data["username"]
+        self.display_name: str = sys.intern(data["displayName"])
+        self.username: str = sys.intern(data["username"])
+
+    @classmethod
+    def resolve(cls, data: dict) -> User:
+        """Return the User for *data*, shared with all other content by that user."""
+        return cls._shared(cls._registry, data.get("username", ""), data)
 
     def get_title(self) -> str:
         return self.display_name
@@ -288,18 +515,35 @@ class User(ConfluenceObject):
 
 
 class Space(ConfluenceObject):
+    __slots__ = ("date", "gui_url", "key", "name")
+
+    # Loaded when first used
+    date: str
+    gui_url: str
+
+    # key -> Space, for as long as anything refers to it
+    _registry: ClassVar[WeakValueDictionary[str, Space]] = WeakValueDictionary()
+
     def __init__(self, data: dict) -> None:
         super().__init__(data)
         self.type: str = "space"
-        self.key: str = data["key"]
+        self.key: str = sys.intern(data["key"])
         self.name: str = data["name"]
-        self.date: str = convert_date(data["timestamp"], "friendly") if "timestamp" in data else "?"
+
+    def _load_date(self) -> str:
+        return convert_date(self._data["timestamp"], "friendly") if "timestamp" in self._data else "?"
+
+    def _load_gui_url(self) -> str:
         # Space directory API provides links as an array; content API nests under _links
-        self.gui_url: str = ""
         try:
-            self.gui_url = data["link"][1]["href"]
+            return self._data["link"][1]["href"]
         except (KeyError, IndexError):
-            self.gui_url = data.get("_links", {}).get("webui", "")
+            return self._data.get("_links", {}).get("webui", "")
+
+    @classmethod
+    def resolve(cls, data: dict) -> Space:
+        """Return the Space for *data*, shared with all other content in that space."""
+        return cls._shared(cls._registry, data.get("key", ""), data)
 
     def get_title(self) -> str:
         return self.name
@@ -315,10 +559,11 @@ class Space(ConfluenceObject):
 
 
 class Generic(ConfluenceObject):
+    __slots__ = ("title",)
+
     def __init__(self, data: dict) -> None:
         super().__init__(data)
         self.type: str = "?"
-        log.debug(json.dumps(data, indent=2))
         self.title: str = data.get("title", "Generic object")
 
     def get_title(self) -> str:
@@ -349,7 +594,7 @@ class ContentWrapper:
         self.type: str = content_data["type"]
         cls = self.type_map.get(self.type)
         if cls is not None:
-            self.content: ConfluenceObject = cls(content_data)
+            self.content: ConfluenceObject = cls.resolve(content_data)
         else:
             log.error(f"Unknown entity type: {self.type}")
             self.content = Generic(content_data)
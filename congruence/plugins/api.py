@@ -18,8 +18,9 @@
 
 from __future__ import annotations
 
-from congruence.confluence import CommentContextView, ContentList, PageView
+from congruence.confluence import CommentContextView, ContentList, PageView, content_prefetch_requests
 from congruence.logging import log
+from congruence.profiles import expand
 from congruence.views.listbox import ColumnListBoxEntry
 
 __help__ = """Confluence API
@@ -37,11 +38,14 @@ is indicated by a single letter:
 
 
 class APIView(ContentList):
+    preloadable = True
+
     def __init__(self, properties: dict | None = None) -> None:
         self.title = "API"
         super().__init__(EntryClass=CongruenceAPIEntry, help_string=__help__)
         if properties:
             self.params = properties["Parameters"]
+        self.params.setdefault("expand", expand("list", prefix="content."))
         self.update()
         if self.entries:
             self.set_focus(0)
@@ -59,6 +63,9 @@ class CongruenceAPIEntry(ColumnListBoxEntry):
             return CommentContextView(page_id, obj.content, obj.content.id)
         return None
 
+    def get_prefetch_requests(self) -> list[dict]:
+        return content_prefetch_requests(self.obj)  # type: ignore[arg-type]
+
     def search_match(self, search_string: str) -> bool:
         from congruence.objects import ContentWrapper
         obj: ContentWrapper = self.obj  # type: ignore[assignment]
@@ -18,18 +18,23 @@
 
 from __future__ import annotations
 
-from typing import Any, cast
+from typing import TYPE_CHECKING, Any, cast
 
 import urwid
 
+from congruence.args import config
 from congruence.confluence import PageView
 from congruence.external import open_doc_in_cli_browser, open_gui_browser
-from congruence.interface import make_request
+from congruence.interface import fetch_many, make_request, stream_results
 from congruence.logging import log
 from congruence.objects import Content, Page, Space
+from congruence.profiles import content_request, expand
 from congruence.views.common import key_action
 from congruence.views.treelistbox import CongruenceTreeListBox, CongruenceTreeListBoxEntry
 
+if TYPE_CHECKING:
+    from requests import Response
+
 __help__ = """Confluence Explorer
 
 Expand items with the 'toggle collapse' key. They will dynamically retrieve
@@ -38,21 +43,27 @@ more content.
 
 
 class SpaceView(CongruenceTreeListBox):
+    preloadable = True
+
     def __init__(self, properties: dict | None = None) -> None:
         self.title = "Explorer"
         url = "rest/spacedirectory/1/search"
         params: dict = {"query": "", "type": "global", "status": "current", "startIndex": "0"}
         headers = {"Accept": "application/json"}
-        spaces: list[dict] = []
-        while True:
-            r = make_request(url, params=params, headers=headers)
-            j = r.json()
-            spaces += j["spaces"]
-            if len(spaces) >= j["totalSize"]:
-                break
-            params["startIndex"] = len(spaces)
+        r, stream = stream_results(url, params=params, headers=headers, key="spaces")
+        r.raise_for_status()
+        entries: list[dict] = [_node(Space.resolve(s)) for s in stream]
+        j = stream.envelope
+        page_size = len(entries)
+        if page_size:
+            # The first page tells us how many there are; get the rest at once
+            specs = [
+                {"url": url, "params": {**params, "startIndex": str(start)}, "headers": headers}
+                for start in range(page_size, j["totalSize"], page_size)
+            ]
+            for r in fetch_many(specs):
+                entries += [_node(Space.resolve(s)) for s in r.json()["spaces"]]
 
-        entries: list[dict] = [{s["key"]: ExpandableSpace(s), "children": []} for s in spaces]
         data = {"Space Directory": {"title": "Space Directory"}, "children": entries}
         super().__init__(data, SpaceEntry, help_string=__help__)
 
@@ -61,14 +72,32 @@ class SpaceView(CongruenceTreeListBox):
         focus = self.focus  # type: ignore[union-attr]
         if focus is None:
             return
+        size = cast("tuple[int, int]", size or (0, 0))
         if focus.expanded:  # type: ignore[union-attr]
-            urwid.TreeListBox.keypress(self, cast("tuple[int, int]", size or (0, 0)), "-")
-        else:
-            obj = focus.get_value()  # type: ignore[union-attr]
-            if not getattr(obj, "expanded", True):
-                focus.add_children(obj.get_children())  # type: ignore[union-attr]
-                obj.expanded = True
-            urwid.TreeListBox.keypress(self, cast("tuple[int, int]", size or (0, 0)), "+")
+            urwid.TreeListBox.keypress(self, size, "-")
+            return
+        value = focus.get_node().get_value()  # type: ignore[union-attr]
+        if value.get("loaded", True):
+            urwid.TreeListBox.keypress(self, size, "+")
+            return
+        obj = focus.get_value()  # type: ignore[union-attr]
+        load = get_space_pages if isinstance(obj, Space) else get_child_pages
+        # Set right away, so that toggling again meanwhile does not load them twice
+        value["loaded"] = True
+
+        def expand(children: list) -> None:
+            focus.add_children(children)  # type: ignore[union-attr]
+            if self.focus is focus:
+                urwid.TreeListBox.keypress(self, size, "+")
+            else:
+                focus.expanded = True  # type: ignore[union-attr]
+                focus.update_expanded_icon()  # type: ignore[union-attr]
+
+        def failed(e: Exception) -> None:
+            value["loaded"] = False
+            self.app.show_error(e)
+
+        self.app.run_in_background(lambda: load(obj), expand, failed)
 
     @key_action
     def cli_browser(self, size: tuple | None = None) -> None:
@@ -77,10 +106,13 @@ class SpaceView(CongruenceTreeListBox):
             return
         obj_id = obj.id
         log.debug(f"Build HTML view for page with id '{obj_id}'")
-        r = make_request(f"rest/api/content/{obj_id}?expand=body.storage")
-        content = r.json()["body"]["storage"]["value"]
-        html = f"<html><head></head><body>{content}</body></html>"
-        open_doc_in_cli_browser(html.encode(), self.app)
+
+        def show(r: Response) -> None:
+            content = r.json()["body"]["storage"]["value"]
+            html = f"<html><head></head><body>{content}</body></html>"
+            open_doc_in_cli_browser(html.encode(), self.app)
+
+        self.app.run_in_background(lambda: make_request(**content_request(obj_id, "storage")), show)
 
     @key_action
     def gui_browser(self, size: tuple | None = None) -> None:
@@ -96,29 +128,54 @@ class SpaceView(CongruenceTreeListBox):
         open_gui_browser(url)
 
 
-class ExpandableSpace(Space):
-    """Space that lazily loads its pages on first expansion."""
-
-    def __init__(self, data: dict) -> None:
-        super().__init__(data)
-        self.expanded: bool = False
-
-    def get_children(self) -> list[ExpandablePage]:
-        self.expanded = True
-        log.debug(f"Load descendants of {self.key}...")
-        url = f"rest/api/space/{self.key}/content"
-        params: dict = {"depth": "root", "expand": "body,version,history.lastUpdated,space"}
-        result: list[dict] = []
-        while True:
-            r = make_request(url, params=params)
-            j = r.json()
-            result += j["page"]["results"]
-            if len(result) >= j["page"]["size"]:
+def _node(obj: Space | Page) -> dict:
+    """Return the tree data for *obj*, whose children are loaded on first expansion.
+
+    The objects are shared with all other views, so whether the children
+    have been loaded into this tree is kept in the tree data.
+    """
+    return {getattr(obj, "key", obj.id): obj, "children": [], "loaded": False}
+
+
+def get_space_pages(space: Space) -> list[Page]:
+    """Request the top-level pages of *space*.
+
+    The response does not say how many there are, so the ones after the
+    first page of results are requested several pages at a time, until a
+    page is not full.
+    """
+    log.debug(f"Load descendants of {space.key}...")
+    url = f"rest/api/space/{space.key}/content"
+    params: dict = {"depth": "root", "expand": expand("list")}
+    j = make_request(url, params=params).json()["page"]
+    result: list[dict] = j["results"]
+    limit = j.get("limit") or len(result)
+    while limit and len(j["results"]) >= limit:
+        start = len(result)
+        specs = [
+            {"url": url, "params": {**params, "start": start + i * limit, "limit": limit}}
+            for i in range(config["MaxConnectionsPerHost"])
+        ]
+        for r in fetch_many(specs):
+            j = r.json()["page"]
+            result += j["results"]
+            if len(j["results"]) < limit:
                 break
-            params["startIndex"] = len(result)
-        pages = [ExpandablePage(p) for p in result]
-        log.debug(f"Retrieved {len(pages)} items")
-        return pages
+    pages = [Page.resolve(p) for p in result]
+    log.debug(f"Retrieved {len(pages)} items")
+    return pages
+
+
+def get_child_pages(page: Page) -> list[Page]:
+    """Request the child pages of *page*."""
+    log.debug(f"Load child pages of {page.id}...")
+    r = make_request(
+        f"rest/api/content/{page.id}/child/page",
+        params={"expand": expand("list")},
+    )
+    pages = [Page.resolve(p) for p in r.json()["results"]]
+    log.debug(f"Retrieved {len(pages)} items")
+    return pages
 
 
 class SpaceEntry(CongruenceTreeListBoxEntry):
@@ -137,6 +194,12 @@ class SpaceEntry(CongruenceTreeListBoxEntry):
             pass
         return None
 
+    def get_prefetch_requests(self) -> list[dict]:
+        obj = self.get_value()
+        if isinstance(obj, Page):
+            return [content_request(obj.id, "storage")]
+        return []
+
     def search_match(self, search_string: str) -> bool:
         obj = self.get_value()
         if isinstance(obj, dict):
@@ -145,8 +208,7 @@ class SpaceEntry(CongruenceTreeListBoxEntry):
 
     def add_children(self, children: list) -> None:
         for child in children:
-            child_id = getattr(child, "key", child.id)
-            self.node.get_value()["children"].append({child_id: child, "children": []})
+            self.node.get_value()["children"].append(_node(child))
         # Rebuild the child node cache so the tree walker sees the new nodes
         if hasattr(self.node, "_child_keys"):
             self.node._child_keys = None
@@ -158,23 +220,4 @@ class SpaceEntry(CongruenceTreeListBoxEntry):
         return obj.get_title()
 
 
-class ExpandablePage(Page):
-    """Page that lazily loads its subpages on first expansion."""
-
-    def __init__(self, data: dict) -> None:
-        super().__init__(data)
-        self.expanded: bool = False
-
-    def get_children(self) -> list[ExpandablePage]:
-        self.expanded = True
-        log.debug(f"Load child pages of {self.id}...")
-        r = make_request(
-            f"rest/api/content/{self.id}/child/page",
-            params={"expand": "body,version,history.lastUpdated,space"},
-        )
-        pages = [ExpandablePage(p) for p in r.json()["results"]]
-        log.debug(f"Retrieved {len(pages)} items")
-        return pages
-
-
 PluginView = SpaceView
@@ -18,11 +18,13 @@
 
 from __future__ import annotations
 
+from collections.abc import Callable
+
 import urwid
 
 import congruence.strings as cs
 from congruence.external import open_gui_browser
-from congruence.interface import convert_date, html_to_text, make_request, md_to_html
+from congruence.interface import convert_date, html_to_text, make_request, md_to_html, prerender
 from congruence.logging import log
 from congruence.objects import ConfluenceObject, is_blacklisted_user
 from congruence.views.common import CongruenceTextBox, key_action
@@ -36,44 +38,60 @@ Here you can see the latest entries of the microblog plugin.
 
 
 class MicroblogView(CongruenceListBox):
+    preloadable = True
+
     def __init__(self, properties: dict | None = None) -> None:
         self.title = "Microblog"
         self.properties = properties or {}
-        self.fetch_limit: int = 20
-        self.reply_limit: int = 999
-        self.post_data: str = ""
+        # Number of posts received so far; only changed on the main thread
         self.offset: int = 0
+        self.entries: list = []
         self.update()
         super().__init__(self.entries, help_string=__help__)
 
     @key_action
     def update(self, size: tuple | None = None) -> None:
-        params = self.properties.get("Parameters", {})
-        self.fetch_limit = params.get("limit", 20)
-        self.reply_limit = params.get("replyLimit", 999)
-        self.post_data = self.properties.get("Data", "")
-        self.offset = 0
-        self.entries = self._get_microblog()
-        self.app.alert(f"Received {len(self.entries)} items", "info")
-        if hasattr(self, "walker"):
-            self.redraw()
+        self.load_entries(self._next_posts(offset=0), replace=True)
 
     @key_action
     def load_more(self, size: tuple | None = None) -> None:
-        self.entries += self._get_microblog()
-        self.redraw()
+        self.load_entries(self._next_posts(self.offset))
+
+    def _next_posts(self, offset: int) -> Callable[[], list]:
+        """Return a job for load_entries that fetches the posts after *offset*.
+
+        The request is built now, so the job does not see changes made while
+        it runs; the offset moves on once the posts have arrived.
+        """
+        properties = self.properties.get("Parameters", {})
+        params = {
+            "offset": offset,
+            "limit": properties.get("limit", 20),
+            "replyLimit": properties.get("replyLimit", 999),
+        }
+        data = self.properties.get("Data", "")
+        return lambda: self._get_microblog(params, data)
 
-    def _get_microblog(self) -> list:
+    def _set_offset(self, offset: int) -> None:
+        self.offset = offset
+
+    def _get_microblog(self, params: dict, data: str) -> list:
         log.info("Fetch microblog...")
         response = make_request(
             "rest/microblog/1.0/microposts/search",
-            params={"offset": self.offset, "limit": self.fetch_limit, "replyLimit": self.reply_limit},
+            params=params,
             method="POST",
-            data=self.post_data,
+            data=data,
             headers={"Content-Type": "application/json"},
         )
-        result = [MicroblogEntry(MicroblogObject(e), is_reply=False) for e in response.json()["microposts"]]
-        self.offset += len(result)
+        posts = response.json()["microposts"]
+        result = [MicroblogEntry(MicroblogObject(e), is_reply=False) for e in posts]
+        prerender(
+            [e.get("renderedContent", "") for e in posts]
+            + [r.get("renderedContent", "") for e in posts for r in e.get("replies", [])]
+        )
+        self.app.workers.deliver(self._set_offset, params["offset"] + len(result))
+        self.app.alert(f"Received {len(result)} items", "info")
         return result
 
     @key_action
@@ -21,7 +21,7 @@ from __future__ import annotations
 import json
 import re
 
-from congruence.interface import convert_date, html_to_text, make_request
+from congruence.interface import convert_date, html_to_text, make_request, prerender
 from congruence.objects import ConfluenceObject
 from congruence.views.common import CongruenceTextBox, key_action
 from congruence.views.listbox import ColumnListBoxEntry, CongruenceListBox
@@ -34,6 +34,8 @@ This view displays your latest notifications.
 
 
 class NotificationView(CongruenceListBox):
+    preloadable = True
+
     def __init__(self, properties: dict | None = None) -> None:
         self.title = "Notifications"
         props = properties or {}
@@ -47,14 +49,15 @@ class NotificationView(CongruenceListBox):
             params["before"] = before
         r = make_request("rest/mywork/latest/notification", params=params)
         notifications = [NotificationEntry(NotificationObject(e)) for e in r.json()]
+        # The texts are shown in the details of each notification
+        prerender([n.obj.description for n in notifications if n.obj.description], replace_emoticons=True)
         self.app.alert(f"Received {len(notifications)} items", "info")
         return notifications
 
     @key_action
     def load_more(self, size: tuple | None = None) -> None:
         last = self.entries[-1].obj.id
-        self.entries += self.get_notifications(before=last)
-        self.redraw()
+        self.load_entries(lambda: self.get_notifications(before=last))
 
 
 class NotificationEntry(ColumnListBoxEntry):
@@ -18,7 +18,8 @@
 
 from __future__ import annotations
 
-from congruence.confluence import CommentContextView, ContentList, PageView
+from congruence.confluence import CommentContextView, ContentList, PageView, content_prefetch_requests
+from congruence.profiles import expand
 from congruence.views.common import key_action
 from congruence.views.listbox import ColumnListBoxEntry
 
@@ -40,10 +41,7 @@ class APIView(ContentList):
             "start": 0,
             "limit": 20,
             "excerpt": "highlight",
-            "expand": (
-                "content.space,content.history.lastUpdated,"
-                "content.history.previousVersion,space.homepage.history"
-            ),
+            "expand": expand("list", prefix="content."),
             "includeArchivedSpaces": "false",
             "src": "next.ui.search",
         }
@@ -58,12 +56,7 @@ class APIView(ContentList):
         if not query:
             self.app.alert("Query empty, aborting", "warning")
             return
-        self.params["cql"] = f'siteSearch ~ "{query}"'
-        self.params["start"] = 0
-        self.entries = self.get_entries()
-        self.redraw()
-        if self.entries:
-            self.set_focus(0)
+        self.stream_entries(self.next_page(cql=f'siteSearch ~ "{query}"', start=0), replace=True)
 
 
 class SearchResultEntry(ColumnListBoxEntry):
@@ -77,6 +70,9 @@ class SearchResultEntry(ColumnListBoxEntry):
             return CommentContextView(page_id, obj.content, obj.content.id)
         return None
 
+    def get_prefetch_requests(self) -> list[dict]:
+        return content_prefetch_requests(self.obj)  # type: ignore[arg-type]
+
     def search_match(self, search_string: str) -> bool:
         from congruence.objects import ContentWrapper
         obj: ContentWrapper = self.obj  # type: ignore[assignment]
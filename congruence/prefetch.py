@@ -0,0 +1,158 @@
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Background prefetching of responses the user is likely to request next."""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from requests import Response
+
+from congruence.logging import log
+
+
+class Prefetcher:
+    """Fetch requests in the background and hold on to the responses briefly.
+
+    :fetch: callable performing the request described by a spec
+    :max_workers: number of prefetches that may run at the same time
+    :max_bytes: budget for all responses held in memory
+    :ttl: seconds after which a prefetched response is no longer handed out
+    """
+
+    def __init__(self, fetch: Callable[[dict], Response], max_workers: int, max_bytes: int, ttl: float) -> None:
+        self._fetch = fetch
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (future, URL) of the prefetches queued or running
+        self._pending: dict[str, tuple[Future, str]] = {}
+        # Keys of running prefetches whose response is not to be kept
+        self._unwanted: set[str] = set()
+        self._store: OrderedDict[str, tuple[float, str, Response]] = OrderedDict()
+        self._size = 0
+        self.issued = 0
+        self.used = 0
+        self.cancelled = 0
+
+    def submit(self, requests: list[tuple[str, dict]]) -> None:
+        """Replace all queued prefetches by *requests*, a list of (key, spec).
+
+        Prefetches that have already started are allowed to finish.
+        """
+        self.cancel()
+        with self._lock:
+            for key, spec in requests:
+                if key in self._store or key in self._pending:
+                    continue
+                self._pending[key] = (self._executor.submit(self._run, key, spec), spec["url"])
+                self.issued += 1
+
+    def cancel(self) -> None:
+        with self._lock:
+            for key, (future, _) in list(self._pending.items()):
+                if future.cancel():
+                    del self._pending[key]
+                    self.cancelled += 1
+
+    def join(self, key: str) -> None:
+        """Note that a request waits for the prefetch of *key* and uses its response.
+
+        The response is then not kept, since handing it out once more could
+        show data that the user has changed in the meantime.
+        """
+        with self._lock:
+            if key in self._pending:
+                self._unwanted.add(key)
+                self.used += 1
+
+    def discard(self, key: str) -> None:
+        """Drop the prefetch of *key*, which is being requested by other means."""
+        with self._lock:
+            if key not in self._pending:
+                return
+            future, _ = self._pending[key]
+            if future.cancel():
+                del self._pending[key]
+                self.cancelled += 1
+            else:
+                self._unwanted.add(key)
+
+    def invalidate(self, url: str) -> None:
+        """Forget what was prefetched from *url* or below it, which has just been changed."""
+
+        def affected(other: str) -> bool:
+            return other == url or other.startswith(f"{url.rstrip('/')}/")
+
+        with self._lock:
+            for key, (_, other, response) in list(self._store.items()):
+                if affected(other):
+                    del self._store[key]
+                    self._size -= len(response.content)
+            for key, (_, other) in self._pending.items():
+                if affected(other):
+                    self._unwanted.add(key)
+
+    def _run(self, key: str, spec: dict) -> None:
+        try:
+            response = self._fetch(spec)
+        except Exception as e:
+            log.debug(f"Prefetch of {spec.get('url')} failed: {e}")
+            return
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+                unwanted = key in self._unwanted
+                self._unwanted.discard(key)
+        size = len(response.content)
+        if unwanted or response.status_code != 200 or size > self.max_bytes:
+            return
+        with self._lock:
+            self._store[key] = (time.monotonic(), spec["url"], response)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, _, old) = self._store.popitem(last=False)
+                self._size -= len(old.content)
+        log.debug(f"Prefetched {spec.get('url')} ({size} bytes)")
+
+    def take(self, key: str) -> Response | None:
+        """Return and forget the prefetched response for *key*, if it is still fresh."""
+        with self._lock:
+            item = self._store.pop(key, None)
+            if item is None:
+                return None
+            stored, _, response = item
+            self._size -= len(response.content)
+            if time.monotonic() - stored > self.ttl:
+                return None
+            self.used += 1
+        return response
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "issued": self.issued,
+                "used": self.used,
+                "cancelled": self.cancelled,
+                "stored": len(self._store),
+                "size": self._size,
+            }
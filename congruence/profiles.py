@@ -0,0 +1,84 @@
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Named sets of fields that are expanded when requesting content.
+
+Views ask for a profile instead of spelling out the `expand` parameter, so
+that a list does not transfer bodies and version histories it never shows.
+Heavier fields are requested separately once they are actually needed.
+"""
+
+from __future__ import annotations
+
+from congruence.args import config
+
+# profile: fields relative to a content object
+PROFILES: dict[str, list[str]] = {
+    # Type, title, space and last change; enough for a list entry or PageView
+    "list": ["history.lastUpdated", "space"],
+    # Everything known about one version of an object
+    "detail": ["history.lastUpdated", "space", "version"],
+    # Version information
+    "version": ["version"],
+    # The rendered body
+    "body": ["body.view"],
+    # The body in storage format
+    "storage": ["body.storage"],
+    # A comment thread: rendered comments and where they belong, as requested
+    # before there were profiles
+    "comments": [
+        "body.view",
+        "content",
+        "history.lastUpdated",
+        "version",
+        "ancestors",
+        "extensions.inlineProperties",
+    ],
+}
+
+if "ExpandProfiles" in config:
+    for name, fields in config["ExpandProfiles"].items():
+        PROFILES[name] = list(fields)
+
+# expand parameter -> names of the profiles it was built from
+_names: dict[str, str] = {}
+
+
+def expand(*profiles: str, prefix: str = "") -> str:
+    """Return the expand parameter for the union of *profiles*.
+
+    :prefix: put in front of each field, e.g. "content." for search results
+    """
+    fields: list[str] = []
+    for name in profiles:
+        for field in PROFILES[name]:
+            if field not in fields:
+                fields.append(field)
+    result = ",".join(prefix + f for f in fields)
+    _names[result] = "+".join(profiles)
+    return result
+
+
+def profile_name(expand_parameter: str) -> str:
+    """Return the profiles an expand parameter was built from, if any."""
+    if not expand_parameter:
+        return "-"
+    return _names.get(expand_parameter, expand_parameter)
+
+
+def content_request(obj_id: str, *profiles: str) -> dict:
+    """Return make_request arguments for the content object *obj_id*."""
+    return {"url": f"rest/api/content/{obj_id}", "params": {"expand": expand(*profiles)}}
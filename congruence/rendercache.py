@@ -0,0 +1,127 @@
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Cache for the text rendered from HTML bodies.
+
+Entries are keyed by a hash of the HTML and the render options, so a body
+that has not changed is never rendered twice, no matter which object it
+belongs to. Recently used texts are kept in memory; optionally, they are
+also stored on disk, where they survive a restart.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from congruence.cache import DiskLRU
+from congruence.logging import log
+
+# Part of every key; increase it when the rendering changes, so that texts
+# stored on disk by an older version are not used
+FORMAT = 1
+
+
+def render_key(html: str, *options: object) -> str:
+    """Derive a cache key from *html* and the options it is rendered with."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((FORMAT, *options)).encode())
+    digest.update(html.encode("utf-8", errors="surrogatepass"))
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """LRU cache of rendered texts in memory and, optionally, on disk.
+
+    :max_entries: texts kept in memory
+    :directory: where texts are stored on disk
+    :max_size: budget for the texts on disk in bytes; 0 disables the disk
+    """
+
+    def __init__(self, max_entries: int, directory: str = "", max_size: int = 0) -> None:
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_size = max_size if directory else 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._disk = DiskLRU(directory, self.max_size, ".txt")
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return text
+        if self.max_size:
+            text = self._read(key)
+            if text is not None:
+                self._remember(key, text)
+                with self._lock:
+                    self.disk_hits += 1
+                return text
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, text: str) -> None:
+        self._remember(key, text)
+        if self.max_size:
+            self._write(key, text)
+
+    def _remember(self, key: str, text: str) -> None:
+        with self._lock:
+            self._memory[key] = text
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _read(self, key: str) -> str | None:
+        if not self._disk.touch(key):
+            return None
+        try:
+            with open(self._disk.path(key), encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write(self, key: str, text: str) -> None:
+        data = text.encode("utf-8")
+        tmp = self._disk.temp_path(key)
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._disk.path(key))
+        except OSError as e:
+            log.error(f"Could not write render cache entry: {e}")
+            return
+        self._disk.add(key, len(data))
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._memory),
+                "disk entries": len(self._disk) if self.max_size else 0,
+                "disk size": self._disk.size if self.max_size else 0,
+            }
@@ -0,0 +1,103 @@
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Render many HTML bodies in worker processes.
+
+Converting HTML to text is pure Python and holds the GIL, so threads do not
+help. The pool is started on first use and then kept. Workers are spawned
+rather than forked, since the parent has threads running.
+
+A spawned process runs the main script of the parent again, as __mp_main__.
+The entry point in congruence.__main__ therefore only imports the
+application when it is called, so that besides it, workers only import
+congruence.htmltext: they neither read the configuration nor write to the
+log file.
+"""
+
+from __future__ import annotations
+
+import atexit
+import multiprocessing
+import threading
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from congruence.logging import log
+from congruence.workers import check_cancelled
+
+# Bodies sent to a worker at once
+CHUNK_SIZE = 16
+
+
+class RenderPool:
+    """Persistent pool of processes converting HTML to text.
+
+    :processes: number of worker processes
+    """
+
+    def __init__(self, processes: int) -> None:
+        self.processes = processes
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                log.info(f"Starting {self.processes} render processes")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                atexit.register(self.shutdown)
+            return self._executor
+
+    def render(
+        self, bodies: list[str], replace_emoticons: bool = False, fix_creation_links: bool = False
+    ) -> Iterator[tuple[str, str | None]]:
+        """Yield each of *bodies* with its text, in the order they finish.
+
+        The text is None if rendering failed. If the view this runs for is
+        closed, the bodies not yet sent to a worker are dropped.
+        """
+        from congruence import htmltext
+
+        executor = self._get_executor()
+        pending: dict[Future, list[str]] = {}
+        try:
+            for i in range(0, len(bodies), CHUNK_SIZE):
+                chunk = bodies[i : i + CHUNK_SIZE]
+                future = executor.submit(htmltext.render_all, chunk, replace_emoticons, fix_creation_links)
+                pending[future] = chunk
+            while pending:
+                done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                check_cancelled()
+                for future in done:
+                    chunk = pending.pop(future)
+                    yield from zip(chunk, future.result(), strict=True)
+        except BrokenProcessPool as e:
+            log.error(f"Render processes failed: {e}")
+            with self._lock:
+                self._executor = None
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
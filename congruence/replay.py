@@ -0,0 +1,140 @@
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Record sessions with the server and play them back without a network.
+
+A recording is a JSON Lines file with one request per line: method, URL,
+status, headers, body and how long the request took. Request bodies,
+request headers and cookies are left out, so a recording contains no
+credentials. It does contain whatever content the server sent.
+"""
+
+from __future__ import annotations
+
+import base64
+import gzip
+import io
+import json
+import threading
+import time
+from datetime import timedelta
+
+from requests import PreparedRequest, Response
+from requests.adapters import BaseAdapter
+from requests.exceptions import ConnectionError as RequestConnectionError
+from requests.structures import CaseInsensitiveDict
+
+from congruence.writer import BackgroundWriter
+
+# Response headers that are not recorded
+SKIPPED_HEADERS = {"set-cookie", "content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+class Recorder:
+    """Append requests and their responses to a recording.
+
+    :filename: the JSON Lines file, gzip-compressed if it ends in .gz
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self._writer = BackgroundWriter(filename, compress=filename.endswith(".gz"))
+
+    def record(self, response: Response, elapsed: float) -> None:
+        """Add *response*, which took *elapsed* seconds in total."""
+        body = response.content or b""
+        try:
+            text, encoding = body.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            text, encoding = base64.b64encode(body).decode(), "base64"
+        entry = {
+            "time": time.time(),
+            "method": response.request.method if response.request else "GET",
+            "url": response.request.url if response.request else response.url,
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {k: v for k, v in response.headers.items() if k.lower() not in SKIPPED_HEADERS},
+            "elapsed": elapsed,
+            "ttfb": response.elapsed.total_seconds(),
+            "encoding": encoding,
+            "body": text,
+        }
+        self._writer.write(json.dumps(entry) + "\n")
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport that answers requests from a recording.
+
+    Requests are matched by method and URL. A request made several times
+    gets the recorded responses in order, and the last one after that.
+    Requests that were not recorded fail like an unreachable server.
+
+    :filename: the recording, gzip-compressed if it ends in .gz
+    :latency: wait as long as the recorded request took instead of
+        answering immediately
+    """
+
+    def __init__(self, filename: str, latency: bool = False) -> None:
+        super().__init__()
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[str, str], list[dict]] = {}
+        self._next: dict[tuple[str, str], int] = {}
+        with gzip.open(filename, "rt") if filename.endswith(".gz") else open(filename) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._entries.setdefault((entry["method"], entry["url"]), []).append(entry)
+
+    def send(
+        self,
+        request: PreparedRequest,
+        stream: bool = False,
+        timeout: float | tuple | None = None,
+        verify: bool | str = True,
+        cert: str | tuple | None = None,
+        proxies: dict | None = None,
+    ) -> Response:
+        key = (request.method or "GET", request.url or "")
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise RequestConnectionError(f"Not in the recording: {key[0]} {key[1]}", request=request)
+            i = self._next.get(key, 0)
+            self._next[key] = i + 1
+            entry = entries[min(i, len(entries) - 1)]
+        if self.latency:
+            time.sleep(entry["elapsed"])
+        if entry["encoding"] == "base64":
+            body = base64.b64decode(entry["body"])
+        else:
+            body = entry["body"].encode("utf-8")
+        response = Response()
+        response.status_code = entry["status"]
+        response.reason = entry["reason"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        # The body is read like one that arrives over the network
+        response.raw = io.BytesIO(body)
+        response.url = request.url or ""
+        response.request = request
+        response.elapsed = timedelta(seconds=entry["ttfb"])
+        response.encoding = "utf-8"
+        response.connection = self  # type: ignore[attr-defined]
+        return response
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,49 @@
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Time the phases of startup, for --profile-startup.
+
+The clock starts when this module is imported, which is the first thing
+the entry point does. Phases are marked when they end; each one lasts from
+the end of the previous one.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+
+_start = time.perf_counter()
+_lock = threading.Lock()
+# (phase, seconds since start when it ended)
+phases: list[tuple[str, float]] = []
+
+
+def mark(phase: str) -> None:
+    """Record that *phase* has just ended."""
+    with _lock:
+        phases.append((phase, time.perf_counter() - _start))
+
+
+def report() -> str:
+    """Return a table of the phases recorded so far."""
+    lines = [f"{'Phase':<24} {'[ms]':>8} {'total [ms]':>11}"]
+    previous = 0.0
+    with _lock:
+        for phase, end in phases:
+            lines.append(f"{phase:<24} {(end - previous) * 1000:>8.1f} {end * 1000:>11.1f}")
+            previous = end
+    return "\n".join(lines)
@@ -23,10 +23,14 @@ import urwid
 
 from congruence.ansiescape import translate_text_for_urwid
 from congruence.keys import KEY_ACTIONS
+from congruence.workers import CancelToken, on_main_thread
 
 if TYPE_CHECKING:
     from congruence.app import CongruenceApp
 
+# Seconds the focus must rest on an entry before its next view is prefetched
+PREFETCH_DELAY = 0.3
+
 
 def key_action(f: Callable) -> Callable:
     f.is_key_action = True  # type: ignore[attr-defined]
@@ -49,10 +53,20 @@ class CongruenceView:
     key_actions: ClassVar[list[str]]  # populated by CollectKeyActions metaclass
     title: str
     help_string: str | None
+    # Whether the view can be built ahead of time, see MainMenuEntry.preload
+    preloadable: ClassVar[bool] = False
 
     def selectable(self) -> bool:
         return True
 
+    @property
+    def cancel_token(self) -> CancelToken:
+        """Token that is cancelled as soon as this view is closed."""
+        token = getattr(self, "_cancel_token", None)
+        if token is None:
+            token = self._cancel_token = CancelToken()
+        return token
+
     def keypress(self, size: tuple[int, ...], key: str) -> str | None:
         if key not in KEY_ACTIONS or KEY_ACTIONS[key] not in self.key_actions:
             return key
@@ -63,6 +77,41 @@ class CongruenceView:
             return None
         return super().keypress(size, key)  # type: ignore[misc]
 
+    def shown(self) -> None:
+        """Called on the main thread whenever this view becomes the current one."""
+        if hasattr(self, "_prefetch_alarm"):
+            # The focus may have been set while the view was built
+            self._focus_changed()
+
+    def watch_focus(self, walker: urwid.ListWalker) -> None:
+        """Prefetch the next view of an entry once the focus rests on it."""
+        self._prefetch_alarm: Any = None
+        urwid.connect_signal(walker, "modified", self._focus_changed)
+        self._focus_changed()
+
+    def _focus_changed(self) -> None:
+        loop = getattr(self.app, "loop", None)
+        if loop is None:
+            return
+        # Views are built in the background, but urwid is not thread-safe
+        if not on_main_thread():
+            self.app.workers.call_soon(self._focus_changed)
+            return
+        if self._prefetch_alarm is not None:
+            loop.remove_alarm(self._prefetch_alarm)
+        self._prefetch_alarm = loop.set_alarm_in(PREFETCH_DELAY, self._prefetch_focus)
+
+    def _prefetch_focus(self, loop: urwid.MainLoop, user_data: Any = None) -> None:
+        self._prefetch_alarm = None
+        if self.app.get_current_widget() is not self:
+            return
+        widget = getattr(self, "focus", None)
+        specs = widget.get_prefetch_requests() if hasattr(widget, "get_prefetch_requests") else []
+        if specs:
+            from congruence.interface import prefetch
+
+            prefetch(specs)
+
 
 class CongruenceTextBox(CongruenceView, urwid.ListBox, metaclass=CollectKeyActions):
     def __init__(self, text: Any, color: bool = False, help_string: str | None = None) -> None:
@@ -101,3 +150,22 @@ class CongruenceTextBox(CongruenceView, urwid.ListBox, metaclass=CollectKeyActio
     @key_action
     def scroll_to_top(self, size: tuple | None = None) -> None:
         self.set_focus(0, coming_from="below")
+
+
+class LoadingView(CongruenceTextBox):
+    """Placeholder shown while the actual view is built in the background."""
+
+    def __init__(self) -> None:
+        self.title = "Loading"
+        super().__init__("Loading ...", help_string="The view is still loading. Go back to abandon it.\n")
+
+
+class NotCachedView(CongruenceTextBox):
+    """Placeholder for a view whose content is not in the cache while offline."""
+
+    def __init__(self, reason: Exception) -> None:
+        self.title = "Offline"
+        super().__init__(
+            ("warning", f"{reason}\n\nThis was not loaded during an earlier online session."),
+            help_string="Congruence is offline and can only show what is in the cache.\n",
+        )
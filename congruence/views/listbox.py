@@ -16,11 +16,107 @@
 
 from __future__ import annotations
 
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
 from typing import Any, cast
 
 import urwid
 
 from congruence.views.common import CollectKeyActions, CongruenceTextBox, CongruenceView, key_action
+from congruence.workers import on_main_thread
+
+# Rows whose widgets are kept: more than fit on a screen, so that scrolling
+# back and forth does not build them again
+KEEP_WIDGETS = 200
+
+
+class EntryWalker(urwid.ListWalker):
+    """List walker over entries that only builds the widgets of rows shown.
+
+    The list is used as it is, not copied; call modified() after changing it.
+    Once more than *keep* rows have been built, the widgets of the row shown
+    least recently are released. Columns are as wide as their widest value
+    in the rows shown so far.
+
+    :entries: the CongruenceListBoxEntry objects to show
+    :keep: number of rows whose widgets are kept
+    """
+
+    def __init__(self, entries: list, keep: int = KEEP_WIDGETS) -> None:
+        self.entries = entries
+        self.focus = 0
+        self.keep = keep
+        # Column widths for ColumnListBoxEntry rows
+        self.widths: list[int] | None = None
+        self._built: OrderedDict[int, CongruenceListBoxEntry] = OrderedDict()
+
+    def set_entries(self, entries: list) -> None:
+        """Show *entries* instead of the current list."""
+        if entries is not self.entries:
+            self._release_all()
+            self.entries = entries
+            self.widths = None
+        self.modified()
+
+    def _widen(self, widths: list[int] | None) -> None:
+        """Make the columns at least as wide as *widths*."""
+        if widths is None:
+            return
+        if self.widths is not None:
+            widths = [max(a, b) for a, b in zip(self.widths, widths, strict=True)]
+        if widths != self.widths:
+            self.widths = widths
+            for entry in self._built.values():
+                entry.set_widths(widths)
+
+    def modified(self) -> None:
+        if self.focus >= len(self.entries):
+            self.focus = max(0, len(self.entries) - 1)
+        self._modified()
+
+    def _release_all(self) -> None:
+        for entry in self._built.values():
+            entry.release()
+        self._built.clear()
+
+    def __getitem__(self, position: int) -> CongruenceListBoxEntry:
+        if position < 0:
+            raise IndexError(position)
+        entry = self.entries[position]
+        key = id(entry)
+        if key in self._built:
+            self._built.move_to_end(key)
+        else:
+            self._widen(entry.column_widths())
+            entry.set_widths(self.widths)
+            self._built[key] = entry
+            if len(self._built) > self.keep:
+                self._built.popitem(last=False)[1].release()
+        return entry
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def set_focus(self, position: int) -> None:
+        if not 0 <= position < len(self.entries):
+            raise IndexError(f"No widget at position {position}")
+        self.focus = position
+        self._modified()
+
+    def next_position(self, position: int) -> int:
+        if position >= len(self.entries) - 1:
+            raise IndexError(position)
+        return position + 1
+
+    def prev_position(self, position: int) -> int:
+        if position <= 0:
+            raise IndexError(position)
+        return position - 1
+
+    def positions(self, reverse: bool = False) -> Iterable[int]:
+        if reverse:
+            return range(len(self.entries) - 1, -1, -1)
+        return range(len(self.entries))
 
 
 class CongruenceListBox(CongruenceView, urwid.ListBox, metaclass=CollectKeyActions):
@@ -29,36 +125,71 @@ class CongruenceListBox(CongruenceView, urwid.ListBox, metaclass=CollectKeyActio
     def __init__(self, entries: list, help_string: str | None = None) -> None:
         self.entries = entries
         self.help_string = help_string
-        self.walker = urwid.SimpleFocusListWalker(self.entries)
+        self.walker = EntryWalker(self.entries)
         self._search_results: list[int] = []
         self._current_search_result: int = 0
         super().__init__(self.walker)
-        if self.entries and isinstance(self.entries[0], ColumnListBoxEntry):
-            self.align_columns()
-
-    def align_columns(self) -> None:
-        """Set every column to its maximum width across all entries."""
-        widths: list[int] | None = None
-        for e in self.entries:
-            if hasattr(e, "_columns") and e._columns:
-                this_widths = list(map(len, e._columns))
-                if widths:
-                    for i, w in enumerate(this_widths):
-                        widths[i] = max(widths[i], w)
-                else:
-                    widths = this_widths
-        if widths:
-            for e in self.entries:
-                for i, w in enumerate(widths[:-1]):
-                    item = e._inner_widget.contents[i]
-                    e._inner_widget.contents[i] = (
-                        item[0],
-                        e._inner_widget.options("given", w, False),
-                    )
+        self.watch_focus(self.walker)
+
+    def load_entries(self, job: Callable[[], list], replace: bool = False) -> None:
+        """Fetch entries in the background and append them to the list.
+
+        With *replace*, the new entries take the place of the old ones.
+        """
+        self.stream_entries(lambda: iter([job()]), replace)
+
+    def stream_entries(self, batches: Callable[[], Iterable[list]], replace: bool = False) -> None:
+        """Like load_entries, but show each list of entries yielded by
+        *batches* as soon as it is available."""
+        if getattr(self, "_loading", False):
+            self.app.alert("Still loading ...", "warning")
+            return
+        self._loading = True
+        first = True
+
+        def add(entries: list) -> None:
+            nonlocal first
+            if replace and first:
+                self.entries = entries
+                if hasattr(self, "walker"):
+                    self.redraw()
+                    if self.entries:
+                        self.set_focus(0)
+            else:
+                self.entries += entries
+                if hasattr(self, "walker"):
+                    self.redraw()
+            first = False
+
+        def stream(iterator: Iterable[list]) -> None:
+            for entries in iterator:
+                self.app.workers.deliver(add, entries)
+
+        def done(result: None) -> None:
+            self._loading = False
+            if replace and first:
+                add([])
+
+        def failed(e: Exception) -> None:
+            self._loading = False
+            self.app.show_error(e)
+
+        if on_main_thread():
+            self.app.run_in_background(lambda: stream(batches()), done, failed)
+            return
+        # The view is being built in the background: the first batch is shown
+        # with it, the rest is loaded while it is up. This belongs to the view
+        # rather than to the placeholder shown until then.
+        try:
+            iterator = iter(batches())
+            add(next(iterator, []))
+        except BaseException:
+            self._loading = False
+            raise
+        self.app.workers.submit(lambda: stream(iterator), done, failed, self.cancel_token)
 
     def redraw(self) -> None:
-        self.walker[:] = self.entries
-        self.align_columns()
+        self.walker.set_entries(self.entries)
 
     @key_action
     def move_down(self, size: tuple[int, ...] | None = None) -> None:
@@ -89,9 +220,7 @@ class CongruenceListBox(CongruenceView, urwid.ListBox, metaclass=CollectKeyActio
         node = self.get_focus()[0]
         if node is None:
             return
-        view = node.get_next_view()
-        if view is not None:
-            self.app.push_view(view)
+        self.app.push_view_async(node.get_next_view)
 
     @key_action
     def show_details(self, size: tuple | None = None) -> None:
@@ -118,7 +247,7 @@ class CongruenceListBox(CongruenceView, urwid.ListBox, metaclass=CollectKeyActio
     def limit(self, size: tuple | None = None) -> None:
         def limit_inner(expr: str) -> None:
             filtered = [e for e in self.entries if e.search_match(expr)]
-            self.walker[:] = filtered
+            self.walker.set_entries(filtered)
             if expr == ".":
                 self.app.reset_status()
             else:
@@ -143,13 +272,43 @@ class CongruenceListBox(CongruenceView, urwid.ListBox, metaclass=CollectKeyActio
 
 
 class CongruenceListBoxEntry(urwid.WidgetWrap):
-    """Represents one row in a CongruenceListBox."""
+    """Represents one row in a CongruenceListBox.
+
+    The widgets of the row are built when it is first shown, and released
+    by the EntryWalker when it has not been shown for a while.
+    """
 
     def __init__(self, obj: Any) -> None:
         self.obj = obj
-        self._inner_widget = self.wrap_in_widget()
-        self._widget = urwid.AttrMap(self._inner_widget, attr_map="body", focus_map="focus")
-        super().__init__(self._widget)
+        self._inner_widget: urwid.Widget | None = None
+        self._widget: urwid.AttrMap | None = None
+        # WidgetWrap.__init__ expects the widget right away
+        urwid.Widget.__init__(self)
+
+    @property
+    def _wrapped_widget(self) -> urwid.AttrMap:
+        if self._widget is None:
+            self._inner_widget = self.wrap_in_widget()
+            self._widget = urwid.AttrMap(self._inner_widget, attr_map="body", focus_map="focus")
+        return self._widget
+
+    @_wrapped_widget.setter
+    def _wrapped_widget(self, widget: urwid.AttrMap) -> None:
+        self._widget = widget
+
+    def release(self) -> None:
+        """Drop the widgets of this row until it is shown again."""
+        if self._widget is not None:
+            self._widget = None
+            self._inner_widget = None
+            self._invalidate()
+
+    def column_widths(self) -> list[int] | None:
+        """Return the widths this row needs for its columns, if it has any."""
+        return None
+
+    def set_widths(self, widths: list[int] | None) -> None:
+        """Use *widths* for the columns of this row, if it has any."""
 
     def wrap_in_widget(self) -> urwid.Widget:
         try:
@@ -166,6 +325,10 @@ class CongruenceListBoxEntry(urwid.WidgetWrap):
     def get_next_view(self) -> object | None:
         return None
 
+    def get_prefetch_requests(self) -> list[dict]:
+        """Return make_request arguments for what get_next_view will need."""
+        return []
+
     def get_details_view(self) -> CongruenceTextBox:
         text = self.obj.get_json()
         view = CongruenceTextBox(text)
@@ -192,7 +355,32 @@ class CardedListBoxEntry(CongruenceListBoxEntry):
 class ColumnListBoxEntry(CongruenceListBoxEntry):
     """List entry rendered as five fixed-width columns."""
 
+    def __init__(self, obj: Any) -> None:
+        super().__init__(obj)
+        # Computed when the row is first shown, then kept while the widgets
+        # are not, since the column widths derive from them
+        self._columns: list[str] | None = None
+        self._widths: list[int] | None = None
+
+    @property
+    def columns(self) -> list[str]:
+        if self._columns is None:
+            self._columns = self.obj.get_columns()
+            assert len(self._columns) == 5
+        return self._columns
+
+    def column_widths(self) -> list[int]:
+        return [len(c) for c in self.columns]
+
+    def set_widths(self, widths: list[int] | None) -> None:
+        if widths != self._widths:
+            self._widths = widths
+            self.release()
+
     def wrap_in_widget(self) -> urwid.Columns:
-        self._columns: list[str] = self.obj.get_columns()
-        assert len(self._columns) == 5
-        return urwid.Columns([(urwid.Text(t, wrap="clip")) for t in self._columns], dividechars=1)
+        texts = [urwid.Text(t, wrap="clip") for t in self.columns]
+        if not self._widths:
+            return urwid.Columns(texts, dividechars=1)
+        # The last column takes the remaining space
+        given = [(w, t) for w, t in zip(self._widths[:-1], texts[:-1], strict=True)]
+        return urwid.Columns([*given, texts[-1]], dividechars=1)
@@ -18,11 +18,17 @@
 
 from __future__ import annotations
 
+import time
+from concurrent.futures import Future
 from importlib import import_module
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
+from congruence.logging import log
 from congruence.views.listbox import CongruenceListBox, CongruenceListBoxEntry
 
+if TYPE_CHECKING:
+    from congruence.workers import BackgroundWorker
+
 __help__ = """Congruence - a TUI for Confluence
     Adrian Vollmer, 2020
 
@@ -31,24 +37,70 @@ configured in $XDG_CONFIG_HOME/congruence/config.yaml. Each plugin can be
 used multiple times.
 """
 
+# Seconds after which a preloaded view that has not been opened is
+# considered out of date and built again
+PRELOAD_TTL = 600
+# Seconds to wait for a preload that is still running before building the
+# view again
+PRELOAD_WAIT = 10
+
 
 class CongruenceMainMenu(CongruenceListBox):
     def __init__(self, plugins: list[dict]) -> None:
         entries = [MainMenuEntry(p) for p in plugins]
         super().__init__(entries, help_string=__help__)
 
+    def preload(self) -> None:
+        """Build the views of plugins configured with `Preload` in the background."""
+        for entry in self.entries:
+            if entry.plugin_data.get("Preload"):
+                entry.preload(self.app.workers)
+
+
+def _discard(future: Future) -> None:
+    """Stop what a preloaded view that is not going to be shown is still loading."""
+    if not future.cancelled() and future.exception() is None:
+        future.result().cancel_token.cancel()
+
 
 class MainMenuEntry(CongruenceListBoxEntry):
     def __init__(self, data: dict) -> None:
         self.plugin_data = data
         title: str = data.get("DisplayName", data["PluginName"])
+        self._preloaded: Future | None = None
+        self._preloaded_at: float = 0.0
         super().__init__(title)
 
     def _get_plugin_class(self, name: str) -> type:
         module = import_module(f"congruence.plugins.{name.lower()}")
         return module.PluginView
 
+    def preload(self, workers: BackgroundWorker) -> None:
+        """Start building the view, which the next get_next_view returns.
+
+        Only views that load their content when they are built and do not
+        wait for input are preloaded.
+        """
+        view_class = self._get_plugin_class(self.plugin_data["PluginName"])
+        if not getattr(view_class, "preloadable", False):
+            log.debug(f"Plugin {self.plugin_data['PluginName']} cannot be preloaded")
+            return
+        log.info(f"Preloading {self.plugin_data['PluginName']}")
+        self._preloaded = workers.submit(lambda: view_class(self.plugin_data))
+        self._preloaded_at = time.monotonic()
+
     def get_next_view(self) -> Any:
+        # A view can only be shown once; after that it is built anew
+        future, self._preloaded = self._preloaded, None
+        # This runs in a worker thread, so a preload that has not started yet
+        # is dropped rather than waited for: it may need this very thread
+        if future is not None and not future.cancel():
+            if time.monotonic() - self._preloaded_at < PRELOAD_TTL:
+                try:
+                    return future.result(timeout=PRELOAD_WAIT)
+                except Exception as e:
+                    log.debug(f"Preloading failed, trying again: {e!r}")
+            future.add_done_callback(_discard)
         view_class = self._get_plugin_class(self.plugin_data["PluginName"])
         return view_class(self.plugin_data)
 
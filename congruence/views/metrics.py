@@ -0,0 +1,54 @@
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import annotations
+
+import os
+import time
+
+import urwid
+
+from congruence.args import data_home
+from congruence.metrics import metrics
+from congruence.views.common import CongruenceTextBox, key_action
+
+__help__ = """Request metrics
+
+Latency percentiles, transferred bytes and cache behaviour of the requests
+made so far, grouped by endpoint, followed by the bytes transferred per
+expand profile and the counters of the HTTP cache, the prefetcher and
+request coalescing.
+"""
+
+
+class MetricsView(CongruenceTextBox):
+    def __init__(self) -> None:
+        self.title = "Request metrics"
+        super().__init__(metrics.report(), help_string=__help__)
+
+    @key_action
+    def update(self, size: tuple | None = None) -> None:
+        self.body[0] = urwid.Text(metrics.report())
+
+    @key_action
+    def export_metrics(self, size: tuple | None = None) -> None:
+        filename = os.path.join(data_home, f"metrics-{time.strftime('%Y%m%d-%H%M%S')}.json")
+        try:
+            metrics.export(filename)
+        except OSError as e:
+            self.app.alert(f"Could not export metrics: {e}", "error")
+            return
+        self.app.alert(f"Metrics written to {filename}", "info")
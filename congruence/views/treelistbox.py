@@ -38,6 +38,7 @@ class CongruenceTreeListBox(CongruenceView, urwid.TreeListBox, metaclass=Collect
         self.topnode = CongruenceParentNode(self.wrapper, data)
         self.walker = urwid.TreeWalker(self.topnode)
         super().__init__(self.walker)
+        self.watch_focus(self.walker)
 
     @key_action
     def move_down(self, size: tuple[int, ...] | None = None) -> None:
@@ -76,9 +77,7 @@ class CongruenceTreeListBox(CongruenceView, urwid.TreeListBox, metaclass=Collect
         node = self.get_focus()[0]
         if node is None:
             return
-        view = node.get_next_view()  # type: ignore[union-attr]
-        if view is not None:
-            self.app.push_view(view)
+        self.app.push_view_async(node.get_next_view)  # type: ignore[union-attr]
 
     @key_action
     def show_details(self, size: tuple | None = None) -> None:
@@ -156,6 +155,10 @@ class CongruenceTreeListBoxEntry(urwid.TreeWidget):
     def selectable(self) -> bool:
         return True
 
+    def get_prefetch_requests(self) -> list[dict]:
+        """Return make_request arguments for what get_next_view will need."""
+        return []
+
     def get_details_view(self) -> CongruenceTextBox | None:
         if isinstance(self.get_value(), dict):
             return None
@@ -187,8 +190,9 @@ class CongruenceCardTreeWidget(CongruenceTreeListBoxEntry):
         header = urwid.Text(self.get_display_header())
         header = urwid.Columns([("fixed", 1, self.icon), header], dividechars=1)  # type: ignore[arg-type]
         header = urwid.AttrWrap(header, "card-head", "card-focus")
-        if self.get_display_body():
-            body = urwid.AttrWrap(urwid.Text(self.get_display_body()), "body")
+        text = self.get_display_body()
+        if text:
+            body = urwid.AttrWrap(urwid.Text(text), "body")
             return urwid.Pile([header, body])
         return header
 
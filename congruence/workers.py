@@ -0,0 +1,172 @@
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Run blocking work off the urwid main loop.
+
+Jobs run on a thread pool. Their results, and anything else a background
+thread wants to do with the UI, are queued and executed on the main thread
+when urwid notices a write to a pipe registered with `loop.watch_pipe`.
+"""
+
+from __future__ import annotations
+
+import os
+import queue
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+import urwid
+
+from congruence.logging import log
+
+_local = threading.local()
+
+
+def on_main_thread() -> bool:
+    return threading.current_thread() is threading.main_thread()
+
+
+class Cancelled(Exception):
+    """Raised inside a job whose result is no longer wanted."""
+
+
+class CancelToken:
+    """Flag shared by all background work done on behalf of one view."""
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise Cancelled()
+
+
+def current_token() -> CancelToken | None:
+    """Return the token of the job running in this thread, if any."""
+    return getattr(_local, "token", None)
+
+
+def set_current_token(token: CancelToken | None) -> None:
+    _local.token = token
+
+
+def check_cancelled() -> None:
+    """Abort the current job if its view has been closed in the meantime."""
+    token = current_token()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+class BackgroundWorker:
+    """Thread pool whose callbacks are delivered to the urwid main loop.
+
+    :max_workers: number of jobs that may run at the same time
+    """
+
+    def __init__(self, max_workers: int) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="worker")
+        self._calls: queue.SimpleQueue[tuple[Callable, tuple]] = queue.SimpleQueue()
+        self._pipe: int | None = None
+
+    def attach(self, loop: urwid.MainLoop) -> None:
+        """Start delivering callbacks through *loop*."""
+        self._pipe = loop.watch_pipe(self._run_calls)
+        # Deliver whatever was queued before the loop existed
+        os.write(self._pipe, b"\n")
+
+    def call_soon(self, callback: Callable, *args: Any) -> None:
+        """Execute *callback* on the main thread as soon as possible."""
+        self._calls.put((callback, args))
+        if self._pipe is not None:
+            try:
+                os.write(self._pipe, b"\n")
+            except OSError:
+                pass
+
+    def deliver(self, callback: Callable[[Any], None], result: Any) -> None:
+        """Pass *result* to *callback* on the main thread, unless the job
+        running in this thread is cancelled before it gets there."""
+        self.call_soon(self._deliver, current_token(), callback, result)
+
+    def _run_calls(self, data: bytes) -> bool:
+        while True:
+            try:
+                callback, args = self._calls.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except urwid.ExitMainLoop:
+                raise
+            except Exception as e:
+                log.exception(e)
+        # Keep the pipe open
+        return True
+
+    def submit(
+        self,
+        job: Callable[[], Any],
+        callback: Callable[[Any], None] | None = None,
+        errback: Callable[[Exception], None] | None = None,
+        token: CancelToken | None = None,
+    ) -> Future:
+        """Run *job* in the background.
+
+        Its result is passed to *callback*, an exception to *errback*; both
+        are called on the main thread. Once *token* is cancelled, the job
+        stops at its next request and neither callback is called.
+
+        The returned Future holds the result as well, or the exception,
+        which is Cancelled if the job was cancelled.
+        """
+
+        def run() -> Any:
+            if token is not None and token.cancelled:
+                raise Cancelled()
+            set_current_token(token)
+            try:
+                result = job()
+            except Cancelled:
+                log.debug("Background job cancelled")
+                raise
+            except Exception as e:
+                log.exception(e)
+                if errback is not None:
+                    self.call_soon(self._deliver, token, errback, e)
+                raise
+            finally:
+                set_current_token(None)
+            if callback is not None:
+                self.call_soon(self._deliver, token, callback, result)
+            return result
+
+        return self._executor.submit(run)
+
+    @staticmethod
+    def _deliver(token: CancelToken | None, callback: Callable, result: Any) -> None:
+        if token is not None and token.cancelled:
+            log.debug("Discarding result of cancelled job")
+            return
+        callback(result)
@@ -0,0 +1,132 @@
+#  congruence: A command line interface to Confluence
+#  Copyright (C) 2020  Adrian Vollmer
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Write log and dump files without blocking the caller.
+
+Text is put on a queue and written by a background thread, which collects
+everything that has queued up meanwhile into one write. Files can be
+gzip-compressed and rotated when they grow too large.
+"""
+
+from __future__ import annotations
+
+import atexit
+import gzip
+import logging
+import os
+import queue
+import sys
+import threading
+from typing import IO
+
+# Texts written at once at most
+BATCH_SIZE = 256
+
+
+class BackgroundWriter:
+    """Append text to a file from a background thread.
+
+    New files are only readable by the owner, since they may contain
+    session data.
+
+    :filename: the file to append to
+    :compress: write gzip members instead of plain text
+    :max_size: rotate the file once it is larger than this many bytes; 0
+        means never
+    :backups: how many rotated files are kept (FILE.1 is the most recent)
+    """
+
+    def __init__(self, filename: str, compress: bool = False, max_size: int = 0, backups: int = 3) -> None:
+        self.filename = filename
+        self.compress = compress
+        self.max_size = max_size
+        self.backups = backups
+        self._queue: queue.SimpleQueue[str | None] = queue.SimpleQueue()
+        self._file: IO[bytes] | None = None
+        self._thread = threading.Thread(target=self._run, name="writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, text: str) -> None:
+        self._queue.put(text)
+
+    def close(self) -> None:
+        """Write everything that is still queued and stop the thread."""
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not None and len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            texts = [t for t in batch if t is not None]
+            if texts:
+                try:
+                    self._write("".join(texts).encode("utf-8", errors="replace"))
+                except OSError as e:
+                    # Logging this could end up here again
+                    print(f"Could not write to {self.filename}: {e}", file=sys.stderr)
+            if stop:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
+
+    def _write(self, data: bytes) -> None:
+        if self._file is None:
+            fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            self._file = os.fdopen(fd, "ab")
+        if self.compress:
+            # One complete gzip member per batch keeps the file readable at any time
+            data = gzip.compress(data)
+        self._file.write(data)
+        self._file.flush()
+        if self.max_size and self._file.tell() > self.max_size:
+            self._rotate()
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.backups <= 0:
+            os.remove(self.filename)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            older = f"{self.filename}.{i}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.filename}.{i + 1}")
+        os.replace(self.filename, f"{self.filename}.1")
+
+
+class WriterHandler(logging.Handler):
+    """Logging handler that hands formatted records to a BackgroundWriter."""
+
+    def __init__(self, writer: BackgroundWriter) -> None:
+        super().__init__()
+        self.writer = writer
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.writer.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)